@@ -13,7 +13,7 @@ from pathlib import Path
 import logging
 from openpyxl import load_workbook, Workbook
 from openpyxl.styles import Border, Side, PatternFill, Font, Alignment
-from openpyxl.utils import get_column_letter
+from openpyxl.utils import get_column_letter, column_index_from_string
 import shutil
 import xlrd
 
@@ -64,6 +64,15 @@ class ExcelProcessor:
     # Исходный столбец J (количество) стал столбцом G  
     NUMERIC_COLUMNS = {'G'}  # Только столбец G содержит числовые данные (количество)
     
+    # Стили ячеек сохраняемого листа - общие объекты для всех ячеек
+    _THIN_BORDER = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    _BODY_FONT = Font(name='Calibri', size=11)
+    
     def __init__(self, input_file: str):
         """
         Инициализация процессора
@@ -562,7 +571,13 @@ class ExcelProcessor:
             # Записываем новые данные
             logger.info(f"Записываем обработанные данные ({len(self.df)} строк, {len(self.df.columns)} столбцов)")
             
-            for row_idx, (_, row) in enumerate(self.df.iterrows(), start=1):
+            # Номера числовых столбцов вычисляем один раз, а не для каждой ячейки
+            numeric_col_indices = {column_index_from_string(col) for col in self.NUMERIC_COLUMNS}
+            thin_border = self._THIN_BORDER
+            body_font = self._BODY_FONT
+            
+            # Строки берем кортежами (без создания Series на каждую строку)
+            for row_idx, row in enumerate(self.df.itertuples(index=False, name=None), start=1):
                 for col_idx, value in enumerate(row, start=1):
                     cell = dest_worksheet.cell(row=row_idx, column=col_idx)
                     
@@ -571,8 +586,8 @@ class ExcelProcessor:
                         cell.value = None
                     else:
                         # Проверяем числовые столбцы (только начиная со второй строки)
-                        col_letter = get_column_letter(col_idx)
-                        if col_letter in self.NUMERIC_COLUMNS and row_idx > 1 and value is not None:
+                        if col_idx in numeric_col_indices and row_idx > 1 and value is not None:
+                            col_letter = get_column_letter(col_idx)
                             # Пытаемся конвертировать в число
                             try:
                                 if isinstance(value, str):
@@ -603,19 +618,9 @@ class ExcelProcessor:
                         else:
                             cell.value = value
                     
-                    # Применяем базовое форматирование границ
-                    cell.border = Border(
-                        left=Side(style='thin'),
-                        right=Side(style='thin'),
-                        top=Side(style='thin'),
-                        bottom=Side(style='thin')
-                    )
-                    
-                    # Применяем базовый шрифт
-                    cell.font = Font(
-                        name='Calibri',
-                        size=11
-                    )
+                    # Применяем базовое форматирование границ и шрифт
+                    cell.border = thin_border
+                    cell.font = body_font
             # Применяем ширину столбцов
             logger.info("Применяем ширину столбцов...")
             
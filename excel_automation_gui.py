@@ -16,6 +16,7 @@ __version__ = "1.6.0"
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
+import multiprocessing
 import sys
 import os
 import subprocess
@@ -23,15 +24,15 @@ from pathlib import Path
 import logging
 import pandas as pd
 import re
-from datetime import datetime
 import shutil
 
 # Импортируем наши модули
 from automation_tool_fixed import ExcelProcessor
 from material_sorter import MaterialSorter
-from excel_to_txt_converter import ExcelToTxtConverter
+from excel_to_txt_converter import ExcelToTxtConverter, current_year_suffix
 
 APP_VERSION = __version__  # Используем версию из системы версионирования
+_ORDER_NUMBER_RE = re.compile(r'[0-9]+')  # Номер круга - только цифры
 
 # Создаем папки для организации файлов
 def ensure_directories():
@@ -67,10 +68,11 @@ class GUILogHandler(logging.Handler):
 class ExcelAutomationGUI:
     """Главный класс GUI приложения"""
     
+    WINDOW_SIZE = (900, 700)  # Ширина и высота главного окна
+    
     def __init__(self, root):
         self.root = root
         self.root.title("MyshkinTool - Полная обработка")
-        self.root.geometry("900x700")
         self.root.minsize(800, 600)
         
         # Создаем необходимые папки
@@ -91,11 +93,12 @@ class ExcelAutomationGUI:
         self.center_window()
     
     def center_window(self):
-        """Центрирует окно на экране"""
-        self.root.update_idletasks()
-        x = (self.root.winfo_screenwidth() // 2) - (self.root.winfo_width() // 2)
-        y = (self.root.winfo_screenheight() // 2) - (self.root.winfo_height() // 2)
-        self.root.geometry(f"+{x}+{y}")
+        """Задает размер окна и центрирует его на экране"""
+        # Размер известен заранее, поэтому не ждем расчета геометрии через update_idletasks
+        width, height = self.WINDOW_SIZE
+        x = (self.root.winfo_screenwidth() - width) // 2
+        y = (self.root.winfo_screenheight() - height) // 2
+        self.root.geometry(f"{width}x{height}+{x}+{y}")
     
     def setup_ui(self):
         """Настройка пользовательского интерфейса"""
@@ -194,14 +197,15 @@ class ExcelAutomationGUI:
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         self.gui_handler.setFormatter(formatter)
         
-        # Настраиваем корневой логгер
-        logging.basicConfig(level=logging.INFO, handlers=[self.gui_handler])
+        # Подключаем обработчик один раз к корневому логгеру. Модули уже вызвали
+        # basicConfig при импорте, поэтому добавляем его явно, а не через basicConfig
+        root_logger = logging.getLogger()
+        root_logger.setLevel(logging.INFO)
+        root_logger.addHandler(self.gui_handler)
         
-        # Добавляем обработчик к существующим логгерам модулей
+        # Уровень логгеров модулей
         for module_name in ['__main__', 'automation_tool_fixed', 'material_sorter', 'excel_to_txt_converter']:
-            logger = logging.getLogger(module_name)
-            logger.addHandler(self.gui_handler)
-            logger.setLevel(logging.INFO)
+            logging.getLogger(module_name).setLevel(logging.INFO)
     
     def clear_log(self):
         """Очищает лог"""
@@ -225,8 +229,8 @@ class ExcelAutomationGUI:
                 updater = SimpleUpdater(__version__, current_dir)
                 
                 try:
-                    # Проверяем наличие обновлений
-                    has_update, new_version = updater.check_for_updates()
+                    # Проверка по кнопке всегда обращается к удаленному репозиторию, минуя кэш
+                    has_update, new_version = updater.check_for_updates(force=True)
                     
                     if has_update and new_version:
                         # Есть новая версия
@@ -405,11 +409,21 @@ class ExcelAutomationGUI:
         """Перезапускает приложение"""
         try:
             logging.info("Перезапуск приложения...")
-            self.root.quit()
             
-            # Перезапускаем приложение
-            import subprocess
-            subprocess.Popen([sys.executable, __file__])
+            # Собранный exe запускается напрямую, скрипт - через интерпретатор
+            if getattr(sys, 'frozen', False):
+                command = [sys.executable]
+            else:
+                command = [sys.executable, __file__]
+            
+            # На Windows новый процесс не привязываем к консоли и группе текущего
+            creationflags = 0
+            if sys.platform == 'win32':
+                creationflags = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+            
+            # Сначала запускаем новый экземпляр, затем закрываем текущий
+            subprocess.Popen(command, creationflags=creationflags, close_fds=True)
+            self.root.quit()
             
         except Exception as e:
             logging.error(f"Ошибка при перезапуске: {e}")
@@ -581,9 +595,7 @@ class ExcelAutomationGUI:
             messagebox.showerror("Ошибка", "Введите номер круга")
             return False
         
-        try:
-            int(self.order_number.get().strip())
-        except ValueError:
+        if not _ORDER_NUMBER_RE.fullmatch(self.order_number.get().strip()):
             messagebox.showerror("Ошибка", "Номер круга должен быть числом")
             return False
         
@@ -609,11 +621,8 @@ class ExcelAutomationGUI:
             input_path = Path(self.input_file.get())
             order_num = self.order_number.get().strip()
             
-            # Формируем OrderID
-            current_year = datetime.now().year
-            year_suffix = str(current_year)[-2:]
-            formatted_number = f"{int(order_num):03d}"
-            order_id = f"{year_suffix}-{formatted_number}"
+            # Формируем OrderID (номер уже проверен в validate_inputs - только цифры)
+            order_id = f"{current_year_suffix()}-{order_num.lstrip('0').zfill(3)}"
             
             logging.info(f"=== Начало обработки файла ===")
             logging.info(f"Входной файл: {input_path.name}")
@@ -738,60 +747,7 @@ def create_sorted_workbook_auto(sorter, output_file, order_id):
     """
     Автоматическая версия create_sorted_workbook без запроса у пользователя
     """
-    if not hasattr(sorter, 'thickness_groups'):
-        logging.error("Данные не отсортированы. Сначала вызовите sort_data_by_thickness()")
-        return False
-    
-    try:
-        from openpyxl import Workbook
-        
-        sorter.output_file = Path(output_file)
-        logging.info(f"Создаем файл с сортировкой по толщине: {sorter.output_file}")
-        
-        # Создаем новую книгу
-        wb = Workbook()
-        wb.remove(wb.active)
-        
-        # Создаем листы для каждой толщины в определенном порядке
-        thickness_order = ["1mm", "1.5mm", "2mm", "3mm"]
-        
-        for thickness in thickness_order:
-            if thickness in sorter.thickness_groups:
-                ws = wb.create_sheet(thickness)
-                sorter._populate_worksheet(ws, sorter.thickness_groups[thickness], order_id)
-                logging.info(f"Создан лист '{thickness}' с {len(sorter.thickness_groups[thickness])} строками")
-        
-        # Добавляем листы для других толщин (если есть)
-        for thickness in sorter.thickness_groups:
-            if thickness not in thickness_order:
-                ws = wb.create_sheet(thickness)
-                sorter._populate_worksheet(ws, sorter.thickness_groups[thickness], order_id)
-                logging.info(f"Создан лист '{thickness}' с {len(sorter.thickness_groups[thickness])} строками")
-        
-        # Создаем лист для неклассифицированных данных (если есть)
-        if sorter.unmatched_rows:
-            real_unmatched = []
-            for row in sorter.unmatched_rows:
-                first_value = row.iloc[0] if len(row) > 0 else ""
-                if not (isinstance(first_value, str) and 
-                       first_value in ['№', 'Порядковый номер', 'OrderID', 'PartName', 'Приоритет', 'nan']):
-                    real_unmatched.append(row)
-            
-            if real_unmatched:
-                ws = wb.create_sheet("Неопределенные")
-                sorter._populate_worksheet(ws, real_unmatched, order_id)
-                logging.info(f"Создан лист 'Неопределенные' с {len(real_unmatched)} строками")
-        
-        # Сохраняем файл
-        wb.save(sorter.output_file)
-        wb.close()
-        
-        logging.info(f"✓ Файл успешно сохранен: {sorter.output_file}")
-        return True
-        
-    except Exception as e:
-        logging.error(f"Ошибка при создании файла: {e}")
-        return False
+    return sorter.create_sorted_workbook(output_file, order_id=order_id)
 
 # Добавляем метод к классу MaterialSorter
 MaterialSorter.create_sorted_workbook_auto = create_sorted_workbook_auto
@@ -816,4 +772,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Нужно для пула процессов конвертера в собранном exe
+    multiprocessing.freeze_support()
     main()
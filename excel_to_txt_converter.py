@@ -8,12 +8,25 @@
 Дата: 2025-08-12
 """
 
-import pandas as pd
 import re
+import os
 import sys
 from pathlib import Path
+from datetime import date, datetime
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
 import logging
+import multiprocessing
+
+# python-calamine (Rust) читает xlsx в несколько раз быстрее openpyxl - используем, если установлен
+try:
+    import python_calamine
+    _HAS_CALAMINE = True
+except ImportError:
+    _HAS_CALAMINE = False
 
 # Настройка логирования
 def setup_logging():
@@ -34,6 +47,7 @@ def setup_logging():
         level=logging.INFO,
         format='%(asctime)s - %(levelname)s - %(message)s',
         handlers=[
+            # Каждая запись сразу попадает в файл: лог нужен для разбора сбоев, в том числе аварийных
             logging.FileHandler(log_file, encoding='utf-8'),
             logging.StreamHandler()
         ]
@@ -42,6 +56,248 @@ def setup_logging():
 
 logger = setup_logging()
 
+# Параметры записи TXT файлов
+_WRITE_BUFFER_SIZE = 1024 * 1024  # Буфер файла 1 МиБ
+_WRITE_CHUNK_ROWS = 1024          # Строк в одном блоке записи (один join и одно encode на блок)
+_NEWLINE = os.linesep             # Как в текстовом режиме: '\r\n' на Windows
+_ONE_SHOT_LIMIT = 64 * 1024 * 1024  # До 64 МиБ лист собирается в памяти и записывается сразу целиком
+
+# Пул процессов окупается только на больших книгах: каждый процесс заново импортирует модуль
+# и открывает всю книгу (на Windows - spawn). Меньшие файлы конвертируются последовательно
+_PARALLEL_MIN_FILE_SIZE = 8 * 1024 * 1024  # 8 МиБ
+
+# Шаблоны OrderID в имени файла
+_ORDER_ID_NEW = re.compile(r'(\d{2}-\d{3})')  # Новый формат: "25-072"
+_ORDER_ID_OLD = re.compile(r'^(\d+)')          # Старый формат: число в начале имени ("72.temp_original")
+
+# Названия листов, которые в имени файла пишутся без точки
+_SHEET_NAME_OVERRIDES = {"1.5mm": "15mm"}
+
+
+# Целые числа от этого порога записываются в xlsx с экспонентой ("1E+16") и читаются openpyxl как float
+_INT_STORAGE_LIMIT = 1e16
+
+
+class _CalamineSheet:
+    """Лист python-calamine с интерфейсом листа openpyxl (только чтение значений)"""
+    
+    def __init__(self, sheet):
+        self._sheet = sheet
+        # start/end - первая и последняя заполненные ячейки (с нуля), для пустого листа - None.
+        # iter_rows calamine начинает с первой строки листа, но с первого заполненного столбца
+        self._first_col = sheet.start[1] if sheet.start else 0
+        end = sheet.end
+        self.max_row = end[0] + 1 if end else 0
+        self.max_column = end[1] + 1 if end else 0
+    
+    def calculate_dimension(self, force=False):
+        """Возвращает диапазон листа, как openpyxl (например, "A1:AA2")"""
+        return f"A1:{get_column_letter(max(self.max_column, 1))}{max(self.max_row, 1)}"
+    
+    def iter_rows(self, values_only=True):
+        """
+        Возвращает строки листа в виде кортежей, как openpyxl iter_rows(values_only=True)
+        
+        Значения приводятся к типам openpyxl: пустые ячейки - None, даты - datetime,
+        целые числа - int. calamine отдает все числа как float и не сообщает, как число
+        записано в файле, поэтому int получают целые значения меньше 1e16 - такие
+        Excel и openpyxl записывают цифрами без точки и экспоненты.
+        
+        Известное отличие от openpyxl: формулы без сохраненного значения
+        calamine возвращает пустыми, а openpyxl - текстом формулы.
+        """
+        col_padding = (None,) * self._first_col
+        for row in self._sheet.iter_rows():
+            yield col_padding + tuple(_calamine_value(v) for v in row)
+
+
+def current_year_suffix():
+    """
+    Возвращает две последние цифры текущего года для OrderID
+    
+    Вычисляется при каждом вызове: приложение может работать через Новый год.
+    
+    Returns:
+        str: "25" для 2025 года
+    """
+    return str(datetime.now().year)[-2:]
+
+
+def _calamine_value(value, _float=float, _date=date, _datetime=datetime):
+    """Приводит значение ячейки calamine к типу, который вернул бы openpyxl"""
+    value_type = type(value)
+    if value_type is _float:
+        if value.is_integer() and -_INT_STORAGE_LIMIT < value < _INT_STORAGE_LIMIT:
+            return int(value)
+        return value
+    if value == "":
+        return None
+    if value_type is _date:
+        # Даты openpyxl возвращает как datetime (с нулевым временем)
+        return _datetime(value.year, value.month, value.day)
+    return value
+
+
+class _CalamineWorkbook:
+    """Книга python-calamine с интерфейсом книги openpyxl (sheetnames, [имя листа], close)"""
+    
+    def __init__(self, filename):
+        self._workbook = python_calamine.CalamineWorkbook.from_path(str(filename))
+        self.sheetnames = list(self._workbook.sheet_names)
+    
+    def __getitem__(self, sheet_name):
+        return _CalamineSheet(self._workbook.get_sheet_by_name(sheet_name))
+    
+    def close(self):
+        self._workbook.close()
+
+
+def _open_workbook(filename):
+    """
+    Открывает книгу только для чтения значений
+    
+    Использует python-calamine, если он установлен, иначе openpyxl в режиме read_only.
+    """
+    if _HAS_CALAMINE:
+        return _CalamineWorkbook(filename)
+    # read_only: ячейки читаются потоково, без построения всей книги в памяти
+    return load_workbook(filename, data_only=True, read_only=True, keep_links=False)
+
+
+def _write_blocks(txt_filepath: Path, blocks):
+    """
+    Записывает готовые блоки байтов в файл напрямую через os.write, без BufferedWriter
+    
+    Блоки пишутся по очереди, без склейки в один bytes - иначе на время
+    записи в памяти была бы вторая копия всего листа. os.write может
+    записать меньше запрошенного, поэтому каждый блок пишется в цикле.
+    """
+    # O_BINARY (только Windows) - иначе os.open откроет файл в текстовом режиме и заменит '\n' на '\r\n'
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+    fd = os.open(txt_filepath, flags, 0o644)
+    try:
+        for block in blocks:
+            view = memoryview(block)
+            while view:
+                written = os.write(fd, view[:_WRITE_BUFFER_SIZE])
+                view = view[written:]
+    finally:
+        os.close(fd)
+
+
+def _cell_to_str(value, _str=str):
+    """Преобразует значение ячейки в строку TXT файла (None -> пустая строка)"""
+    # Строковые ячейки - самые частые - берем как есть, без вызова str()
+    return value if type(value) is _str else ("" if value is None else _str(value))
+
+
+def _write_rows_to_txt(rows, txt_filepath: Path):
+    """
+    Записывает строки листа в TXT файл (разделители - табы)
+    
+    Строки кодируются крупными блоками, минуя построчное кодирование
+    TextIOWrapper. Лист размером до _ONE_SHOT_LIMIT собирается в памяти
+    и записывается сразу целиком; если данных больше, файл открывается
+    и дальше строки пишутся по мере чтения.
+    
+    Пустые строки в конце листа (все ячейки пустые) в файл не пишутся;
+    пустые строки между строками с данными сохраняются.
+    
+    Args:
+        rows: Итератор строк листа (кортежи значений ячеек)
+        txt_filepath (Path): Путь к TXT файлу
+        
+    Returns:
+        int: Количество записанных строк (без отброшенных пустых строк в конце)
+    """
+    row_count = 0
+    log_debug = logger.isEnabledFor(logging.DEBUG)
+    
+    pending = []       # Закодированные блоки, еще не записанные в файл
+    pending_size = 0
+    f = None
+    
+    def emit(block):
+        nonlocal pending_size, f
+        if f is not None:
+            f.write(block)
+            return
+        pending.append(block)
+        pending_size += len(block)
+        if pending_size > _ONE_SHOT_LIMIT:
+            # Лист слишком большой, чтобы держать его в памяти - переходим на потоковую запись
+            f = open(txt_filepath, 'wb', buffering=_WRITE_BUFFER_SIZE)
+            f.writelines(pending)
+            pending.clear()
+    
+    try:
+        rows = iter(rows)
+        if log_debug:
+            # Логируем первые несколько строк для отладки и возвращаем их в поток
+            head = list(islice(rows, 3))
+            for row_idx, row in enumerate(head, 1):
+                converted_row = list(map(_cell_to_str, row[:5]))  # Показываем первые 5 значений
+                logger.debug("Строка %d: %s...", row_idx, converted_row)
+            rows = chain(head, rows)
+        
+        chunk = []
+        blank_lines = []  # Пустые строки, ожидающие следующей непустой строки
+        
+        # Локальные имена в цикле ищутся быстрее глобальных и атрибутов
+        cell_to_str = _cell_to_str
+        join_cells = '\t'.join
+        add_line = chunk.append
+        chunk_rows = _WRITE_CHUNK_ROWS
+        
+        for row in rows:
+            # Преобразуем None в пустые строки и все значения в строки
+            line = join_cells(map(cell_to_str, row))
+            
+            # Пустые строки откладываем: если за ними не будет данных, они не попадут в файл
+            if not line.strip('\t'):
+                blank_lines.append(line)
+                continue
+            
+            if blank_lines:
+                chunk.extend(blank_lines)
+                row_count += len(blank_lines)
+                blank_lines = []
+            
+            add_line(line)
+            if len(chunk) >= chunk_rows:
+                emit((_NEWLINE.join(chunk) + _NEWLINE).encode('utf-8'))
+                chunk.clear()
+            
+            row_count += 1
+        
+        if chunk:
+            emit((_NEWLINE.join(chunk) + _NEWLINE).encode('utf-8'))
+        
+        if f is None:
+            _write_blocks(txt_filepath, pending)
+    finally:
+        if f is not None:
+            f.close()
+    
+    return row_count
+
+
+def _convert_sheet_worker(input_file: str, sheet_name: str, txt_filepath: Path):
+    """
+    Конвертирует один лист в TXT файл в отдельном процессе
+    
+    Объект книги нельзя передать между процессами, поэтому каждый
+    процесс сам открывает файл (тем же движком, что и основной процесс).
+    
+    Returns:
+        int: Количество записанных строк
+    """
+    workbook = _open_workbook(input_file)
+    try:
+        return _write_rows_to_txt(workbook[sheet_name].iter_rows(values_only=True), txt_filepath)
+    finally:
+        workbook.close()
+
 
 class ExcelToTxtConverter:
     """Класс для конвертации Excel файлов в TXT формат"""
@@ -56,6 +312,8 @@ class ExcelToTxtConverter:
         self.input_file = Path(input_file)
         self.output_dir = None
         self.workbook = None
+        self._sheet_meta = {}  # Кэш размеров листов: {лист: (строк, столбцов)}
+        self._reopen_workbook = False  # Книга закрыта через close() и при обращении открывается заново
         
         # Проверяем существование файла
         if not self.input_file.exists():
@@ -64,12 +322,19 @@ class ExcelToTxtConverter:
         # Проверяем расширение
         if self.input_file.suffix.lower() not in ['.xlsx', '.xlsm']:
             raise ValueError(f"Неподдерживаемый формат файла: {self.input_file.suffix}")
+        
+        # OrderID зависит только от имени файла - определяем его один раз для всех листов
+        self.order_id = self.extract_order_id_from_filename(self.input_file.name)
+        if not self.order_id:
+            logger.warning(f"Не удалось извлечь OrderID из имени файла {self.input_file.name}")
+            self.order_id = "UNKNOWN"
     
     def load_workbook(self):
         """Загрузка Excel файла"""
         try:
             logger.info(f"Загружаем Excel файл: {self.input_file}")
-            self.workbook = load_workbook(self.input_file, data_only=True)
+            self.workbook = _open_workbook(self.input_file)
+            self._sheet_meta = {}
             logger.info(f"Найдены листы: {self.workbook.sheetnames}")
             return True
             
@@ -77,6 +342,29 @@ class ExcelToTxtConverter:
             logger.error(f"Ошибка при загрузке файла: {e}")
             return False
     
+    def close(self):
+        """
+        Закрывает книгу и освобождает файл
+        
+        Книга только для чтения держит файл открытым. После close() методы
+        конвертера по-прежнему работают: книга открывается заново при первом обращении.
+        """
+        if self.workbook is not None:
+            self.workbook.close()
+            self.workbook = None
+            self._reopen_workbook = True
+    
+    def _require_workbook(self):
+        """
+        Проверяет, что книга доступна, и при необходимости открывает закрытую книгу заново
+        
+        Returns:
+            bool: True, если книга загружена
+        """
+        if self.workbook is None and self._reopen_workbook:
+            return self.load_workbook()
+        return self.workbook is not None
+    
     def extract_order_id_from_filename(self, filename: str):
         """
         Извлекает OrderID из имени файла
@@ -88,27 +376,20 @@ class ExcelToTxtConverter:
             str: OrderID или None если не найден
         """
         # Сначала ищем паттерн типа "25-072" (новый формат)
-        pattern_new = r'(\d{2}-\d{3})'
-        match_new = re.search(pattern_new, filename)
+        match_new = _ORDER_ID_NEW.search(filename)
         
         if match_new:
             return match_new.group(1)
         
         # Если не найден, то пытаемся найти старый формат и преобразовать
         # Ищем число в начале имени файла (например "72" из "72.temp_original")
-        pattern_old = r'^(\d+)'
-        match_old = re.search(pattern_old, filename)
+        match_old = _ORDER_ID_OLD.search(filename)
         
         if match_old:
-            # Получаем текущий год и берем последние две цифры
-            from datetime import datetime
-            current_year = datetime.now().year
-            year_suffix = str(current_year)[-2:]  # "25" для 2025
-            
-            # Преобразуем номер в трёхзначный формат
+            # Преобразуем номер в трёхзначный формат с двумя последними цифрами года
             old_number = int(match_old.group(1))
             formatted_number = f"{old_number:03d}"
-            new_order_id = f"{year_suffix}-{formatted_number}"
+            new_order_id = f"{current_year_suffix()}-{formatted_number}"
             
             logger.info(f"Преобразуем старый номер '{match_old.group(1)}' в новый OrderID '{new_order_id}'")
             return new_order_id
@@ -125,12 +406,18 @@ class ExcelToTxtConverter:
         Returns:
             str: Отформатированное название (например, "15mm", "1mm", "2mm", "3mm")
         """
-        # Для листа "1.5mm" убираем точку -> "15mm"
-        if sheet_name == "1.5mm":
-            return "15mm"
+        # Для листа "1.5mm" убираем точку -> "15mm", остальные листы оставляем как есть
+        return _SHEET_NAME_OVERRIDES.get(sheet_name, sheet_name)
+    
+    def _txt_filepath(self, sheet_name: str, output_dir: Path):
+        """
+        Возвращает путь к TXT файлу для листа
         
-        # Для остальных листов оставляем как есть
-        return sheet_name
+        Имя файла: OrderID_толщина.txt (например, "25-072_15mm.txt")
+        """
+        # Форматируем название листа для имени файла
+        formatted_sheet_name = self.format_sheet_name_for_filename(sheet_name)
+        return output_dir / f"{self.order_id}_{formatted_sheet_name}.txt"
     
     def convert_sheet_to_txt(self, sheet_name: str, output_dir: Path = None):
         """
@@ -141,7 +428,7 @@ class ExcelToTxtConverter:
             output_dir (Path): Директория для сохранения (по умолчанию рядом с исходным файлом)
         """
         try:
-            if self.workbook is None:
+            if not self._require_workbook():
                 logger.error("Workbook не загружен. Сначала вызовите load_workbook()")
                 return False
             
@@ -156,49 +443,13 @@ class ExcelToTxtConverter:
             # Получаем лист
             worksheet = self.workbook[sheet_name]
             
-            # Извлекаем OrderID из имени файла
-            order_id = self.extract_order_id_from_filename(self.input_file.name)
-            if not order_id:
-                logger.warning(f"Не удалось извлечь OrderID из имени файла {self.input_file.name}")
-                order_id = "UNKNOWN"
-            
-            # Форматируем название листа для имени файла
-            formatted_sheet_name = self.format_sheet_name_for_filename(sheet_name)
-            
-            # Создаем имя файла: OrderID_толщина.txt (например, "25-072_15mm.txt")
-            txt_filename = f"{order_id}_{formatted_sheet_name}.txt"
-            txt_filepath = output_dir / txt_filename
-            
-            logger.info(f"Конвертируем лист '{sheet_name}' в файл '{txt_filename}'")
+            txt_filepath = self._txt_filepath(sheet_name, output_dir)
             
-            # Читаем все данные с листа
-            data_rows = []
-            
-            # Получаем все строки из листа
-            for row_idx, row in enumerate(worksheet.iter_rows(values_only=True), 1):
-                # Преобразуем None в пустые строки и все значения в строки
-                converted_row = []
-                for cell_value in row:
-                    if cell_value is None:
-                        converted_row.append("")
-                    else:
-                        converted_row.append(str(cell_value))
-                
-                data_rows.append(converted_row)
-                
-                if row_idx <= 3:  # Логируем первые несколько строк для отладки
-                    logger.debug(f"Строка {row_idx}: {converted_row[:5]}...")  # Показываем первые 5 значений
+            logger.debug("Конвертируем лист '%s' в файл '%s'", sheet_name, txt_filepath.name)
             
-            logger.info(f"Прочитано строк с листа '{sheet_name}': {len(data_rows)}")
+            row_count = _write_rows_to_txt(worksheet.iter_rows(values_only=True), txt_filepath)
             
-            # Записываем в TXT файл (разделители - табы)
-            with open(txt_filepath, 'w', encoding='utf-8') as f:
-                for row in data_rows:
-                    # Объединяем ячейки через табуляцию
-                    txt_line = '\t'.join(row)
-                    f.write(txt_line + '\n')
-            
-            logger.info(f"✓ Файл сохранен: {txt_filepath}")
+            logger.info(f"✓ Лист '{sheet_name}' конвертирован ({row_count} строк): {txt_filepath}")
             return txt_filepath
             
         except Exception as e:
@@ -215,7 +466,7 @@ class ExcelToTxtConverter:
         Returns:
             list: Список путей к созданным TXT файлам
         """
-        if self.workbook is None:
+        if not self._require_workbook():
             logger.error("Workbook не загружен. Сначала вызовите load_workbook()")
             return []
         
@@ -223,7 +474,7 @@ class ExcelToTxtConverter:
             # Определяем директорию вывода
             if output_dir is None:
                 output_dir = self.input_file.parent
-            else:
+            elif not isinstance(output_dir, Path):
                 output_dir = Path(output_dir)
             
             self.output_dir = output_dir
@@ -233,18 +484,12 @@ class ExcelToTxtConverter:
             
             logger.info(f"Конвертируем все листы в директорию: {output_dir}")
             
-            created_files = []
-            
-            # Конвертируем каждый лист
-            for sheet_name in self.workbook.sheetnames:
-                logger.info(f"Обрабатываем лист: {sheet_name}")
-                
-                result = self.convert_sheet_to_txt(sheet_name, output_dir)
-                if result:
-                    created_files.append(result)
-                    logger.info(f"✓ Лист '{sheet_name}' конвертирован")
-                else:
-                    logger.error(f"✗ Ошибка при конвертации листа '{sheet_name}'")
+            # Листы независимы друг от друга - несколько листов большой книги конвертируем параллельно
+            sheet_names = self.workbook.sheetnames
+            if len(sheet_names) > 1 and self.input_file.stat().st_size >= _PARALLEL_MIN_FILE_SIZE:
+                created_files = self._convert_sheets_parallel(sheet_names, output_dir)
+            else:
+                created_files = self._convert_sheets_serial(sheet_names, output_dir)
             
             logger.info(f"Конвертация завершена. Создано файлов: {len(created_files)}")
             return created_files
@@ -252,10 +497,85 @@ class ExcelToTxtConverter:
         except Exception as e:
             logger.error(f"Ошибка при конвертации всех листов: {e}")
             return []
+        
+        finally:
+            # Книга только для чтения держит открытый файл - освобождаем его
+            # (при следующем обращении книга откроется заново)
+            self.close()
+    
+    def _convert_sheets_serial(self, sheet_names, output_dir: Path):
+        """Конвертирует листы по очереди в текущем процессе"""
+        created_files = []
+        
+        for sheet_name in sheet_names:
+            logger.debug("Обрабатываем лист: %s", sheet_name)
+            
+            result = self.convert_sheet_to_txt(sheet_name, output_dir)
+            if result:
+                created_files.append(result)
+            else:
+                logger.error(f"✗ Ошибка при конвертации листа '{sheet_name}'")
+        
+        return created_files
+    
+    def _convert_sheets_parallel(self, sheet_names, output_dir: Path):
+        """
+        Конвертирует листы в пуле процессов (по процессу на лист)
+        
+        Если пул процессов недоступен, выполняет конвертацию последовательно.
+        
+        Returns:
+            list: Пути к созданным TXT файлам в порядке листов книги
+        """
+        txt_paths = {sheet_name: self._txt_filepath(sheet_name, output_dir) for sheet_name in sheet_names}
+        converted = set()
+        
+        try:
+            max_workers = min(len(sheet_names), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(_convert_sheet_worker, str(self.input_file), sheet_name, txt_paths[sheet_name]): sheet_name
+                    for sheet_name in sheet_names
+                }
+                
+                for future in as_completed(futures):
+                    sheet_name = futures[future]
+                    try:
+                        row_count = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        logger.error(f"✗ Ошибка при конвертации листа '{sheet_name}': {e}")
+                        continue
+                    
+                    converted.add(sheet_name)
+                    logger.info(f"✓ Лист '{sheet_name}' конвертирован ({row_count} строк): {txt_paths[sheet_name]}")
+                    
+        except (BrokenProcessPool, OSError) as e:
+            logger.warning(f"Параллельная конвертация недоступна ({e}), конвертируем листы последовательно")
+            return self._convert_sheets_serial(sheet_names, output_dir)
+        
+        return [txt_paths[sheet_name] for sheet_name in sheet_names if sheet_name in converted]
+    
+    def _sheet_dimensions(self, sheet_name: str):
+        """
+        Возвращает размеры листа (строк, столбцов)
+        
+        Размеры определяются при первом запросе и кэшируются, чтобы лист
+        не перечитывался повторно.
+        """
+        meta = self._sheet_meta.get(sheet_name)
+        if meta is None:
+            worksheet = self.workbook[sheet_name]
+            # openpyxl в режиме read_only берет размеры из тега dimension, которого может не быть -
+            # тогда они вычисляются по содержимому листа
+            worksheet.calculate_dimension(force=True)
+            meta = self._sheet_meta[sheet_name] = (worksheet.max_row, worksheet.max_column)
+        return meta
     
     def get_info(self):
         """Возвращает информацию о файле и листах"""
-        if self.workbook is None:
+        if not self._require_workbook():
             return "Файл не загружен"
         
         info = f"Excel файл: {self.input_file.name}\n"
@@ -263,9 +583,7 @@ class ExcelToTxtConverter:
         info += f"Листы:\n"
         
         for sheet_name in self.workbook.sheetnames:
-            worksheet = self.workbook[sheet_name]
-            row_count = worksheet.max_row
-            col_count = worksheet.max_column
+            row_count, col_count = self._sheet_dimensions(sheet_name)
             info += f"  • {sheet_name}: {row_count} строк, {col_count} столбцов\n"
         
         return info.strip()
@@ -335,4 +653,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
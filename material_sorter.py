@@ -9,15 +9,30 @@
 """
 
 import pandas as pd
+import importlib.util
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time
 from pathlib import Path
-from openpyxl import Workbook, load_workbook
+from openpyxl import Workbook
 from openpyxl.styles import Border, Side, Font
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.utils import get_column_letter
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.dimensions import ColumnDimension
+from openpyxl.utils import column_index_from_string
 import logging
 
+# Движок pandas для read_excel: engine='calamine' требует установленного python-calamine,
+# сам модуль сортировщик не импортирует - достаточно проверить, что пакет доступен
+_HAS_CALAMINE = importlib.util.find_spec("python_calamine") is not None
+
+# xlsxwriter в режиме constant_memory пишет строки сразу в файл и быстрее openpyxl - используем, если установлен
+try:
+    import xlsxwriter
+    _HAS_XLSXWRITER = True
+except ImportError:
+    _HAS_XLSXWRITER = False
+
 # Настройка логирования
 def setup_logging():
     """Настраивает логирование в папку logs"""
@@ -45,6 +60,25 @@ def setup_logging():
 
 logger = setup_logging()
 
+# Шаблоны толщины в описании материала
+_THICKNESS_DECIMAL_RE = re.compile(r'-([0-9]+,[0-9]+)\s')  # С десятичной дробью: "-1,5 "
+_THICKNESS_INT_RE = re.compile(r'-([0-9]+)\s')            # Целое число: "-2 "
+# Первая цифра версии DXF ("3" или "3.0" -> "3")
+_VERSION_RE = re.compile(r'(\d+)')
+
+# Названия листов основных толщин с десятичной записью ("1,0" -> "1mm", "1,5" -> "1.5mm")
+_LABEL_BY_FLOAT = {1.0: "1mm", 1.5: "1.5mm", 2.0: "2mm", 3.0: "3mm"}
+
+
+def _has_value(values: pd.Series):
+    """
+    Возвращает маску непустых значений столбца
+    
+    Значение считается заданным, если оно не NaN и истинно
+    (как в проверке `pd.notna(x) and x`): пустая строка и 0 - не заданы.
+    """
+    return values.notna() & values.astype(bool)
+
 
 class MaterialSorter:
     """Класс для сортировки материалов по толщине"""
@@ -63,6 +97,91 @@ class MaterialSorter:
     # Константы для числовых столбцов
     NUMERIC_COLUMNS = {'G'}  # Столбец G содержит числовые данные (количество)
     
+    # Оформление ячеек листов по толщине - общее для записи через openpyxl и через xlsxwriter
+    _FONT_NAME = 'Calibri'
+    _FONT_SIZE = 11
+    _BORDER_STYLE = 'thin'
+    
+    # Формат дат по типу значения (как назначает openpyxl); datetime проверяется раньше date
+    _DATE_FORMATS = (
+        (datetime, 'yyyy-mm-dd h:mm:ss'),
+        (date, 'yyyy-mm-dd'),
+        (time, 'h:mm:ss'),
+    )
+    
+    # Номер стиля рамки в xlsxwriter по названию стиля openpyxl
+    _XLSXWRITER_BORDERS = {'thin': 1, 'medium': 2, 'thick': 5}
+    
+    # Стили openpyxl - общие объекты для всех ячеек всех листов
+    _THIN_BORDER = Border(
+        left=Side(style=_BORDER_STYLE),
+        right=Side(style=_BORDER_STYLE),
+        top=Side(style=_BORDER_STYLE),
+        bottom=Side(style=_BORDER_STYLE)
+    )
+    _HEADER_FONT = Font(name=_FONT_NAME, size=_FONT_SIZE, bold=True)
+    _BODY_FONT = Font(name=_FONT_NAME, size=_FONT_SIZE)
+    
+    # Формат чисел по номеру столбца (27 столбцов): '0' для числовых C, D, E, F, L, M, N, Q, R, Y
+    _NUMBER_FORMATS = tuple(
+        '0' if col_idx in (3, 4, 5, 6, 12, 13, 14, 17, 18, 25) else None
+        for col_idx in range(1, 28)
+    )
+    
+    # Заголовки столбцов листов по толщине (27 столбцов)
+    HEADERS = [
+        'OrderID',           # A
+        'PartName',          # B
+        'QuantityOrdered',   # C
+        'QuantityNested',    # D
+        'QuantityCompleted', # E
+        'ExtraAllowed',      # F
+        'Machine',           # G
+        'AssemblyID',        # H
+        'DueDate',           # I
+        'DateWindow',        # J
+        'Priority',          # K
+        'ForcedPriority',    # L
+        'NextPhase',         # M
+        'Status',            # N
+        'Material',          # O
+        'Thickness',         # P
+        'AutoTooling',       # Q
+        'ScriptTooling',     # R
+        'ScriptName',        # S
+        'ManualNesting',     # T
+        'Drawing',           # U
+        'Turret',            # V
+        'ProductionLabel',   # W
+        'Revision',          # X
+        'BendingMode',       # Y
+        'BendingParameters', # Z
+        'Parameters'         # AA
+    ]
+    
+    # Ширина столбцов листов по толщине
+    COLUMN_WIDTHS = {
+        'A': 25, 'B': 25, 'C': 12, 'D': 12, 'E': 12, 'F': 10, 'G': 15,
+        'H': 12, 'I': 12, 'J': 12, 'K': 10, 'L': 10, 'M': 10, 'N': 8,
+        'O': 10, 'P': 10, 'Q': 10, 'R': 10, 'S': 15, 'T': 20, 'U': 15,
+        'V': 10, 'W': 15, 'X': 10, 'Y': 10, 'Z': 15, 'AA': 15
+    }
+    
+    # Машина (столбец G) для листа толщины; для остальных листов - пусто
+    MACHINE_BY_SHEET = {"1mm": "A5-25", "2mm": "A5-25", "3mm": "A5-25", "1.5mm": "E5_TOPAZ"}
+    
+    # Суффикс толщины в имени детали и пути к чертежу; для остальных листов - пусто
+    THICKNESS_SUFFIX_BY_SHEET = {"1mm": "_1mmZn", "1.5mm": "_1.5mmZn", "2mm": "_2mmZn", "3mm": "_3mmZn"}
+    
+    # Значения столбца A, по которым строка считается заголовком, а не данными
+    _HEADER_SENTINELS = frozenset({'nan', 'Порядковый номер', 'OrderID', 'PartName', 'Приоритет', '№'})
+    
+    # Столбцы строк групп, которые читает _rows_for_sheet: исходные A-G и вычисленные заранее
+    _ROW_COLUMNS = [0, 1, 2, 3, 4, 5, 6, '_qty_int', '_designation', '_version']
+    
+    # Папка с чертежами деталей (столбец U)
+    DRAWING_BASE_PATH = r"\\srvdata\FMS\ncexpress\E5_TOPAZ\PARTDIR"
+    
     def __init__(self, input_file: str):
         """
         Инициализация сортировщика материалов
@@ -87,12 +206,23 @@ class MaterialSorter:
         try:
             logger.info(f"Загружаем данные из файла: {self.input_file}")
             
-            # Загружаем данные
-            self.df = pd.read_excel(
-                self.input_file,
-                engine='openpyxl',
-                header=None  # Не используем первую строку как заголовки
-            )
+            # Загружаем данные (header=None - не используем первую строку как заголовки).
+            # Берем только столбцы A-G: остальные не используются, и pandas не разбирает их значения
+            df = None
+            if _HAS_CALAMINE:
+                try:
+                    df = pd.read_excel(self.input_file, engine='calamine', header=None,
+                                       usecols=self._is_data_column)
+                except (ImportError, ValueError) as e:
+                    # Движок calamine есть только в pandas >= 2.2
+                    logger.warning(f"Движок calamine недоступен ({e}), загружаем через openpyxl")
+            
+            if df is None:
+                # pandas открывает книгу openpyxl в режиме read_only, без стилей
+                df = pd.read_excel(self.input_file, engine='openpyxl', header=None,
+                                   usecols=self._is_data_column)
+            
+            self.df = df
             
             logger.info(f"Данные загружены. Размер: {self.df.shape}")
             return True
@@ -101,6 +231,21 @@ class MaterialSorter:
             logger.error(f"Ошибка при загрузке файла: {e}")
             return False
     
+    @staticmethod
+    def _is_data_column(column) -> bool:
+        """
+        Отбирает столбцы A-G для загрузки (usecols для pd.read_excel)
+        
+        Функция вместо диапазона "A:G" не вызывает ошибку, если в файле меньше столбцов.
+        
+        Args:
+            column (int): Номер столбца (с 0, так как header=None)
+            
+        Returns:
+            bool: True для столбцов A-G
+        """
+        return column < 7
+    
     def extract_thickness_from_material(self, material_description: str):
         """
         Извлекает толщину из описания материала
@@ -115,47 +260,131 @@ class MaterialSorter:
             return None
             
         # Ищем паттерн типа "1,0", "1,5", "2,0", "3,0" и т.д. (с десятичной дробью)
-        pattern_decimal = r'-([0-9]+,[0-9]+)\s'
-        match_decimal = re.search(pattern_decimal, str(material_description))
-        
+        match_decimal = _THICKNESS_DECIMAL_RE.search(str(material_description))
         if match_decimal:
-            thickness_str = match_decimal.group(1)
+            return self._thickness_label(match_decimal.group(1))
+        
+        # Ищем паттерн типа "1", "2", "3" и т.д. (целые числа без десятичной части)
+        match_integer = _THICKNESS_INT_RE.search(str(material_description))
+        if match_integer:
+            return self._thickness_label(match_integer.group(1))
+        
+        return None
+    
+    @staticmethod
+    def _thickness_label(thickness_str: str):
+        """
+        Возвращает название листа для найденной толщины
+        
+        Args:
+            thickness_str (str): Толщина из описания материала ("1,5" или "2")
+            
+        Returns:
+            str: Название листа (например, "1.5mm", "2mm")
+        """
+        if ',' in thickness_str:
             # Заменяем запятую на точку и конвертируем в float
             thickness_float = float(thickness_str.replace(',', '.'))
             
-            # Определяем соответствующий лист
-            if thickness_float == 1.0:
-                return "1mm"
-            elif thickness_float == 1.5:
-                return "1.5mm"
-            elif thickness_float == 2.0:
-                return "2mm"
-            elif thickness_float == 3.0:
-                return "3mm"
-            else:
-                # Для других значений создаем название листа
-                return f"{thickness_str.replace(',', '.')}mm"
+            # Определяем соответствующий лист; для других значений создаем название листа
+            label = _LABEL_BY_FLOAT.get(thickness_float)
+            if label is None:
+                label = f"{thickness_str.replace(',', '.')}mm"
+            return label
         
-        # Ищем паттерн типа "1", "2", "3" и т.д. (целые числа без десятичной части)
-        pattern_integer = r'-([0-9]+)\s'
-        match_integer = re.search(pattern_integer, str(material_description))
+        # Целая толщина: "1" -> "1mm", "04" -> "4mm"
+        return f"{int(thickness_str)}mm"
+    
+    def _thickness_labels(self, materials: pd.Series):
+        """
+        Определяет толщину сразу для всего столбца описаний материала
         
-        if match_integer:
-            thickness_str = match_integer.group(1)
-            thickness_int = int(thickness_str)
-            
-            # Определяем соответствующий лист
-            if thickness_int == 1:
-                return "1mm"
-            elif thickness_int == 2:
-                return "2mm"
-            elif thickness_int == 3:
-                return "3mm"
-            else:
-                # Для других значений создаем название листа
-                return f"{thickness_int}mm"
+        Даёт тот же результат, что extract_thickness_from_material для
+        каждой строки: сначала ищется толщина с десятичной дробью, затем целая.
         
-        return None
+        Args:
+            materials (pd.Series): Столбец с описаниями материала
+            
+        Returns:
+            pd.Series: Названия листов (NaN, если толщина не найдена)
+        """
+        materials = materials.astype(str)
+        thickness_str = materials.str.extract(_THICKNESS_DECIMAL_RE, expand=False)
+        
+        no_decimal = thickness_str.isna()
+        if no_decimal.any():
+            thickness_str[no_decimal] = materials[no_decimal].str.extract(_THICKNESS_INT_RE, expand=False)
+        
+        # Различных толщин немного - название листа вычисляем один раз для каждой
+        labels = {value: self._thickness_label(value) for value in thickness_str.dropna().unique()}
+        return thickness_str.map(labels)
+    
+    @staticmethod
+    def _parse_quantity(quantities: pd.Series):
+        """
+        Преобразует столбец количества в целые числа
+        
+        Каждое значение округляется до целого; в строках запятая заменяется
+        на точку, а пробелы удаляются ("2,5" -> 2, " 1 0 " -> 10).
+        Пустые и нечисловые значения дают 0.
+        
+        Args:
+            quantities (pd.Series): Столбец количества (G)
+            
+        Returns:
+            pd.Series: Количество (int)
+        """
+        clean = (quantities.astype(str)
+                 .str.strip()
+                 .str.replace(',', '.', regex=False)
+                 .str.replace(' ', '', regex=False))
+        numbers = pd.to_numeric(clean, errors='coerce').fillna(0)
+        return numbers.round().astype(int)
+    
+    def _sum_quantity(self, quantities: pd.Series):
+        """
+        Суммирует столбец количества (значения разбираются как в _parse_quantity)
+        
+        Args:
+            quantities (pd.Series): Столбец количества (G)
+            
+        Returns:
+            int: Сумма количества
+        """
+        return int(self._parse_quantity(quantities).sum())
+    
+    def _add_derived_columns(self, data: pd.DataFrame):
+        """
+        Добавляет к строкам данных столбцы, вычисленные сразу для всех строк
+        
+        - _qty_int: количество (G) как int
+        - _designation: обозначение (F) с заменой "ДСМК." на "DSMK." и без " DXF" в конце
+        - _version: версия DXF из столбца E ("_V3"; "_V0", если цифры нет)
+        
+        Args:
+            data (pd.DataFrame): Строки данных (столбцы A-G)
+            
+        Returns:
+            pd.DataFrame: Строки данных с добавленными столбцами
+        """
+        # Регулярные выражения применяем только к заполненным ячейкам:
+        # если столбец группы пуст целиком, строковые операции не выполняются
+        designations = data.iloc[:, 5]
+        designations = designations[_has_value(designations)]
+        transformed = (designations.astype(str)
+                       .str.replace('ДСМК.', 'DSMK.', regex=False)
+                       .str.removesuffix(' DXF'))
+        
+        versions = data.iloc[:, 4]
+        versions = versions[_has_value(versions)]
+        # Ищем цифру в строке типа "3" или "3.0" -> берем первую цифру
+        version_digits = versions.astype(str).str.extract(_VERSION_RE, expand=False)
+        
+        return data.assign(
+            _qty_int=self._parse_quantity(data.iloc[:, 6]),
+            _designation=transformed.reindex(data.index, fill_value=""),
+            _version=("_V" + version_digits).reindex(data.index).fillna("_V0"),
+        )
     
     def sort_data_by_thickness(self):
         """Сортирует данные по толщине материала"""
@@ -172,81 +401,45 @@ class MaterialSorter:
             quantity_col_index = 6  # Столбец G
             
             # Подсчитываем общее количество во входных данных (пропуская заголовки)
-            total_input_quantity = 0
-            for idx, row in self.df.iterrows():
-                if idx == 0:  # Пропускаем первую строку (заголовки)
-                    continue
-                    
-                qty_value = row.iloc[quantity_col_index]
-                if pd.notna(qty_value):
-                    try:
-                        if isinstance(qty_value, str):
-                            clean_qty = str(qty_value).strip().replace(',', '.').replace(' ', '')
-                            qty_num = int(round(float(clean_qty))) if clean_qty else 0
-                        else:
-                            qty_num = int(round(float(qty_value)))
-                        total_input_quantity += qty_num
-                    except (ValueError, TypeError):
-                        pass
+            total_input_quantity = self._sum_quantity(self.df.iloc[1:, quantity_col_index])
             
             logger.info(f"Общее количество во входных данных: {total_input_quantity}")
             
-            # Создаем словарь для группировки данных по толщине
-            thickness_groups = {}
-            unmatched_rows = []
+            # Определяем толщину для всех строк данных сразу (первая строка - заголовки)
+            data = self.df.iloc[1:]
+            if len(self.df) and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Пропускаем строку заголовков: %s", self.df.iloc[0, 0])
             
-            # Начинаем цикл со второй строки (индекс 1), пропуская заголовки
-            for idx, row in self.df.iterrows():
-                if idx == 0:  # Пропускаем первую строку (заголовки)
-                    logger.debug(f"Пропускаем строку заголовков: {row.iloc[0]}")
-                    continue
-                    
-                material_desc = row.iloc[material_col_index]
-                thickness = self.extract_thickness_from_material(material_desc)
-                
-                if thickness:
-                    if thickness not in thickness_groups:
-                        thickness_groups[thickness] = []
-                    thickness_groups[thickness].append(row)
-                    logger.debug(f"Строка {idx}: '{material_desc}' -> {thickness}")
+            labels = self._thickness_labels(data.iloc[:, material_col_index])
+            
+            # Разбираем количество, обозначение и версию один раз для всех строк
+            data = self._add_derived_columns(data)
+            
+            # Группируем строки по толщине (в порядке первого появления толщины) за один проход:
+            # строки без толщины попадают в группу NaN (dropna=False), отдельная фильтрация не нужна
+            thickness_groups = {}
+            unmatched_rows = data.iloc[:0]
+            for thickness, rows in data.groupby(labels, sort=False, dropna=False):
+                if pd.isna(thickness):
+                    unmatched_rows = rows
                 else:
-                    unmatched_rows.append(row)
-                    logger.warning(f"Строка {idx}: не удалось определить толщину для '{material_desc}'")
+                    thickness_groups[thickness] = rows
+            
+            # Строк без толщины может быть много - не перебираем их, если предупреждения отключены
+            if logger.isEnabledFor(logging.WARNING):
+                for idx, material_desc in unmatched_rows.iloc[:, material_col_index].items():
+                    logger.warning("Строка %s: не удалось определить толщину для '%s'", idx, material_desc)
             
             # Подсчитываем общее количество после группировки
             total_grouped_quantity = 0
             logger.info(f"Группировка завершена:")
             for thickness, rows in thickness_groups.items():
-                thickness_quantity = 0
-                for row in rows:
-                    qty_value = row.iloc[quantity_col_index]
-                    if pd.notna(qty_value):
-                        try:
-                            if isinstance(qty_value, str):
-                                clean_qty = str(qty_value).strip().replace(',', '.').replace(' ', '')
-                                qty_num = int(round(float(clean_qty))) if clean_qty else 0
-                            else:
-                                qty_num = int(round(float(qty_value)))
-                            thickness_quantity += qty_num
-                        except (ValueError, TypeError):
-                            pass
+                thickness_quantity = self._sum_quantity(rows.iloc[:, quantity_col_index])
                 total_grouped_quantity += thickness_quantity
                 logger.info(f"  {thickness}: {len(rows)} строк, количество: {thickness_quantity}")
             
-            if unmatched_rows:
-                unmatched_quantity = 0
-                for row in unmatched_rows:
-                    qty_value = row.iloc[quantity_col_index]
-                    if pd.notna(qty_value):
-                        try:
-                            if isinstance(qty_value, str):
-                                clean_qty = str(qty_value).strip().replace(',', '.').replace(' ', '')
-                                qty_num = int(round(float(clean_qty))) if clean_qty else 0
-                            else:
-                                qty_num = int(round(float(qty_value)))
-                            unmatched_quantity += qty_num
-                        except (ValueError, TypeError):
-                            pass
+            if len(unmatched_rows):
+                unmatched_quantity = self._sum_quantity(unmatched_rows.iloc[:, quantity_col_index])
                 total_grouped_quantity += unmatched_quantity
                 logger.warning(f"  Не классифицировано: {len(unmatched_rows)} строк, количество: {unmatched_quantity}")
             
@@ -268,36 +461,25 @@ class MaterialSorter:
             logger.error(f"Ошибка при сортировке данных: {e}")
             return False
     
-    def create_sorted_workbook(self, output_file: str = None):
+    def create_sorted_workbook(self, output_file: str = None, order_id: str = None):
         """
         Создает новый Excel файл с листами по толщине
         
         Args:
             output_file (str): Путь к выходному файлу
+            order_id (str): OrderID для всех листов (если не указан - запрашивается у пользователя)
         """
         if not hasattr(self, 'thickness_groups'):
             logger.error("Данные не отсортированы. Сначала вызовите sort_data_by_thickness()")
             return False
         
         try:
-            # Сначала получаем OrderID
-            # Получаем текущий год и берем последние две цифры
-            from datetime import datetime
-            current_year = datetime.now().year
-            year_suffix = str(current_year)[-2:]  # Последние 2 цифры года (например, "25" для 2025)
-            
-            # Запрашиваем номер от пользователя
-            raw_order_number = input("Введите номер круга (например, 66 или 1 или 113): ").strip()
-            
-            # Форматируем номер до трёх цифр с ведущими нулями
-            try:
-                order_number = int(raw_order_number)
-                formatted_number = f"{order_number:03d}"  # Форматируем до 3 цифр с ведущими нулями
-                order_id = f"{year_suffix}-{formatted_number}"
-                print(f"Сформированный OrderID: {order_id}")
-            except ValueError:
-                print(f"Ошибка: '{raw_order_number}' не является числом. Используем как есть.")
-                order_id = raw_order_number
+            if order_id is None:
+                # Запрашиваем OrderID один раз для всего файла
+                order_id = self._prompt_order_id()
+                
+                print(f"\n=== Создание файла с листами по толщине ===")
+                print(f"Всего листов для создания: {len(self.thickness_groups)}")
 
             # Определяем имя выходного файла с OrderID
             if output_file is None:
@@ -308,56 +490,48 @@ class MaterialSorter:
             
             logger.info(f"Создаем файл с сортировкой по толщине: {self.output_file}")
             
-            # Запрашиваем OrderID один раз для всего файла
-            print(f"\n=== Создание файла с листами по толщине ===")
-            print(f"Всего листов для создания: {len(self.thickness_groups)}")
-            
-            # Создаем новую книгу
-            wb = Workbook()
-            
-            # Удаляем стандартный лист
-            wb.remove(wb.active)
-            
-            # Создаем листы для каждой толщины в определенном порядке
+            # Собираем листы в нужном порядке: сначала основные толщины, затем остальные
             thickness_order = ["1mm", "1.5mm", "2mm", "3mm"]
             
-            # Сначала создаем листы в нужном порядке
-            for thickness in thickness_order:
-                if thickness in self.thickness_groups:
-                    ws = wb.create_sheet(thickness)
-                    self._populate_worksheet(ws, self.thickness_groups[thickness], order_id)
-                    logger.info(f"Создан лист '{thickness}' с {len(self.thickness_groups[thickness])} строками")
-            
-            # Добавляем листы для других толщин (если есть)
-            for thickness in self.thickness_groups:
-                if thickness not in thickness_order:
-                    ws = wb.create_sheet(thickness)
-                    self._populate_worksheet(ws, self.thickness_groups[thickness], order_id)
-                    logger.info(f"Создан лист '{thickness}' с {len(self.thickness_groups[thickness])} строками")
+            sheets = [(thickness, self.thickness_groups[thickness])
+                      for thickness in thickness_order if thickness in self.thickness_groups]
+            sheets += [(thickness, rows) for thickness, rows in self.thickness_groups.items()
+                       if thickness not in thickness_order]
             
             # Создаем лист для неклассифицированных данных (только если есть данные, не считая заголовки)
-            if self.unmatched_rows:
+            if len(self.unmatched_rows):
                 # Проверяем, что в неопределенных строках есть реальные данные (не только заголовки)
-                real_unmatched = []
-                for row in self.unmatched_rows:
-                    first_value = row.iloc[0] if len(row) > 0 else ""
-                    # Пропускаем заголовки
-                    if not (isinstance(first_value, str) and 
-                           first_value in ['№', 'Порядковый номер', 'OrderID', 'PartName', 'Приоритет', 'nan']):
-                        real_unmatched.append(row)
+                real_unmatched = self.unmatched_rows[~self.unmatched_rows.iloc[:, 0].isin(self._HEADER_SENTINELS)]
                 
-                if real_unmatched:
-                    ws = wb.create_sheet("Неопределенные")
-                    self._populate_worksheet(ws, real_unmatched, order_id)
-                    logger.info(f"Создан лист 'Неопределенные' с {len(real_unmatched)} строками")
+                if len(real_unmatched):
+                    sheets.append(("Неопределенные", real_unmatched))
                 else:
                     logger.info("Неопределенных данных нет (только заголовки)")
             else:
                 logger.info("Все данные успешно классифицированы по толщине")
             
-            # Сохраняем файл
-            wb.save(self.output_file)
-            wb.close()
+            # Значения строк для разных листов независимы - готовим их параллельно,
+            # а запись в книгу выполняем последовательно в этом потоке
+            today_date = self._due_date()  # Дата DueDate одна для всех листов
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                prepared = list(executor.map(
+                    lambda sheet: self._rows_for_sheet(sheet[1], sheet[0], order_id, today_date), sheets))
+            
+            if _HAS_XLSXWRITER:
+                self._save_with_xlsxwriter(sheets, prepared)
+            else:
+                # Создаем новую книгу в потоковом режиме (строки пишутся сразу в архив,
+                # стандартного листа в этом режиме нет)
+                wb = Workbook(write_only=True)
+                
+                for (title, rows), sheet_rows in zip(sheets, prepared):
+                    ws = wb.create_sheet(title)
+                    self._populate_worksheet(ws, rows, order_id, sheet_rows)
+                    logger.info(f"Создан лист '{title}' с {len(rows)} строками")
+                
+                # Сохраняем файл
+                wb.save(self.output_file)
+                wb.close()
             
             logger.info(f"✓ Файл успешно сохранен: {self.output_file}")
             return True
@@ -366,217 +540,258 @@ class MaterialSorter:
             logger.error(f"Ошибка при создании файла: {e}")
             return False
     
-    def _populate_worksheet(self, worksheet, rows_data, order_id):
+    def _save_with_xlsxwriter(self, sheets, prepared):
+        """
+        Сохраняет листы через xlsxwriter в режиме constant_memory
+        
+        Оформление берется из тех же констант, что и в _populate_worksheet():
+        HEADERS, COLUMN_WIDTHS, _NUMBER_FORMATS, шрифт, рамки и форматы дат.
+        
+        Args:
+            sheets (list): Пары (название листа, строки данных)
+            prepared (list): Значения строк каждого листа из _rows_for_sheet()
+        """
+        # strings_to_urls отключен: openpyxl записывает пути и ссылки как обычный текст
+        workbook = xlsxwriter.Workbook(str(self.output_file), {
+            'constant_memory': True,
+            'strings_to_numbers': False,
+            'strings_to_urls': False,
+            'remove_timezone': True,
+        })
+        try:
+            # Общие форматы для всех ячеек всех листов: заголовок и тело по формату чисел
+            cell_style = {
+                'font_name': self._FONT_NAME,
+                'font_size': self._FONT_SIZE,
+                'border': self._XLSXWRITER_BORDERS[self._BORDER_STYLE],
+            }
+            header_format = workbook.add_format({**cell_style, 'bold': True})
+            num_formats = {None, *self._NUMBER_FORMATS, *(fmt for _, fmt in self._DATE_FORMATS)}
+            body_formats = {
+                fmt: workbook.add_format({**cell_style, 'num_format': fmt} if fmt else cell_style)
+                for fmt in num_formats
+            }
+            cell_value = self._cell_value
+            
+            for (title, rows), sheet_rows in zip(sheets, prepared):
+                ws = workbook.add_worksheet(title)
+                
+                # Ширина задается в пикселях (7 на символ): set_column() добавляет к ширине
+                # отступ ячейки, а openpyxl записывает ширину как есть
+                for col_letter, width in self.COLUMN_WIDTHS.items():
+                    col_idx = column_index_from_string(col_letter) - 1
+                    ws.set_column_pixels(col_idx, col_idx, round(width * 7))
+                
+                ws.write_row(0, 0, self.HEADERS, header_format)
+                
+                # В режиме constant_memory строки пишутся строго по порядку
+                write = ws.write
+                for row_idx, new_row_data in enumerate(sheet_rows, start=1):
+                    for col_idx, (value, number_format) in enumerate(zip(new_row_data, self._NUMBER_FORMATS)):
+                        value, number_format = cell_value(value, number_format)
+                        write(row_idx, col_idx, value, body_formats[number_format])
+                
+                logger.info(f"Создан лист '{title}' с {len(rows)} строками")
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def _prompt_order_id():
+        """
+        Запрашивает номер круга у пользователя и формирует OrderID
+        
+        Returns:
+            str: OrderID вида "25-072" (или введенное значение как есть, если это не число)
+        """
+        # Получаем текущий год и берем последние две цифры
+        current_year = datetime.now().year
+        year_suffix = str(current_year)[-2:]  # Последние 2 цифры года (например, "25" для 2025)
+        
+        # Запрашиваем номер от пользователя
+        raw_order_number = input("Введите номер круга (например, 66 или 1 или 113): ").strip()
+        
+        # Форматируем номер до трёх цифр с ведущими нулями
+        try:
+            order_number = int(raw_order_number)
+            formatted_number = f"{order_number:03d}"  # Форматируем до 3 цифр с ведущими нулями
+            order_id = f"{year_suffix}-{formatted_number}"
+            print(f"Сформированный OrderID: {order_id}")
+        except ValueError:
+            print(f"Ошибка: '{raw_order_number}' не является числом. Используем как есть.")
+            order_id = raw_order_number
+        
+        return order_id
+    
+    @staticmethod
+    def _due_date():
+        """Возвращает сегодняшнюю дату в формате 7/24/2025 (месяц/день/год)"""
+        today = datetime.now()
+        return f"{today.month}/{today.day}/{today.year}"
+    
+    def _rows_for_sheet(self, rows_data, sheet_name, order_id, today_date=None):
+        """
+        Формирует значения строк листа в новом формате с 27 столбцами
+        
+        Не обращается к openpyxl, поэтому может выполняться параллельно
+        для разных листов.
+        
+        Args:
+            rows_data (pd.DataFrame): Строки данных листа
+            sheet_name (str): Название листа (толщина, например "1.5mm")
+            order_id: OrderID введенный пользователем для всех листов
+            today_date (str): Дата для столбца DueDate (по умолчанию - сегодня)
+            
+        Returns:
+            list: Список строк, каждая строка - список из 27 значений
+        """
+        if today_date is None:
+            today_date = self._due_date()
+        
+        # Машина и суффикс толщины одинаковы для всех строк листа
+        machine_name = self.MACHINE_BY_SHEET.get(sheet_name, "")
+        thickness_suffix = self.THICKNESS_SUFFIX_BY_SHEET.get(sheet_name, "")
+        
+        # Толщина для столбца P с 6 знаками после запятой ("1.5mm" -> "1.500000"; для листа без толщины - 0)
+        thickness_value = sheet_name.replace('mm', '')
+        thickness_value_str = f"{float(thickness_value) if thickness_value.replace('.', '').isdigit() else 0:.6f}"
+        
+        sheet_rows = []
+        
+        # Количество, обозначение и версия уже разобраны в sort_data_by_thickness();
+        # отсутствующие в данных столбцы получают пустые значения
+        rows = rows_data.reindex(columns=self._ROW_COLUMNS)
+        
+        # Пропускаем строки-заголовки (первая строка данных может содержать заголовки)
+        rows = rows[~rows[0].isin(self._HEADER_SENTINELS)]
+        
+        # Полное имя детали (столбец B) и путь к чертежу (столбец U) собираем сразу для всего листа:
+        # обозначение + версия DXF + суффикс толщины. Строки без обозначения получают пустые значения
+        has_designation = _has_value(rows[5])
+        full_part_names = rows['_designation'].str.strip() + rows['_version'] + thickness_suffix
+        rows = rows.assign(
+            _full_part_name=full_part_names.where(has_designation, ""),
+            _drawing=(self.DRAWING_BASE_PATH + "\\" + full_part_names).where(has_designation, ""),
+        )
+        rows[3] = rows[3].where(rows[3].notna(), "")  # Приоритет (K): пустые значения -> ""
+        
+        for row in rows.itertuples(index=False, name=None):
+            # Извлекаем данные из исходных столбцов
+            # row содержит: A, B, C, D, E, F, G (после обработки automation_tool)
+            # Где: A=исх.A, B=исх.D, C=исх.E, D=исх.G, E=исх.H, F=исх.I, G=исх.J
+            (original_a, original_d, original_e, original_g, original_h, original_i, original_j,
+             quantity_int, transformed_designation, version, full_part_name, drawing_path) = row
+            
+            # Заполняем столбцы согласно новой структуре (используем общий OrderID для всего листа)
+            sheet_rows.append([
+                order_id,                  # A - OrderID (введенный пользователем для всего листа)
+                full_part_name,            # B - PartName (полное имя с версией и толщиной)
+                quantity_int,              # C - QuantityOrdered (количество)
+                0,                         # D - QuantityNested
+                0,                         # E - QuantityCompleted
+                0,                         # F - ExtraAllowed
+                machine_name,              # G - Machine (A5-25 или E5_TOPAZ)
+                "",                        # H - AssemblyID (пустой)
+                today_date,                # I - DueDate (сегодняшняя дата)
+                0,                         # J - DateWindow (в пределах данных заполнен 0)
+                original_g,                # K - Priority (исх. столбец G)
+                0,                         # L - ForcedPriority
+                0,                         # M - NextPhase
+                0,                         # N - Status
+                "DC01",                    # O - Material
+                thickness_value_str,       # P - Thickness (толщина с 6 знаками после запятой)
+                0,                         # Q - AutoTooling
+                0,                         # R - ScriptTooling
+                "",                        # S - ScriptName (пустой)
+                0,                         # T - ManualNesting (в пределах данных заполнен 0)
+                drawing_path,              # U - Drawing (путь к файлу)
+                "",                        # V - Turret (пустой)
+                "",                        # W - ProductionLabel (пустой)
+                "",                        # X - Revision (пустой)
+                -1,                        # Y - BendingMode
+                "",                        # Z - BendingParameters (пустой)
+                ""                         # AA - Parameters (пустой)
+            ])
+        
+        return sheet_rows
+    
+    @classmethod
+    def _cell_value(cls, value, number_format):
+        """
+        Приводит значение ячейки к виду для записи и выбирает его формат
+        
+        Используется обоими движками записи, поэтому файлы через openpyxl
+        и через xlsxwriter получаются одинаковыми.
+        
+        Args:
+            value: Значение из _rows_for_sheet()
+            number_format (str): Формат столбца из _NUMBER_FORMATS (или None)
+            
+        Returns:
+            tuple: (значение, формат) - NaN/NaT/None дают пустую ячейку без формата,
+                   формат столбца применяется только к числам, даты получают формат дат
+        """
+        # NaN и NaT не равны сами себе; pd.NA не сравнивается, проверяем его отдельно
+        if value is None or value is pd.NA or value != value:
+            return None, None
+        if isinstance(value, (int, float)):
+            return value, number_format
+        for value_type, date_format in cls._DATE_FORMATS:
+            if isinstance(value, value_type):
+                return value, date_format
+        return value, None
+    
+    def _populate_worksheet(self, worksheet, rows_data, order_id, sheet_rows=None, today_date=None):
         """
         Заполняет лист данными в новом формате с 27 столбцами
         
+        Строки добавляются через worksheet.append(), поэтому лист может
+        принадлежать книге в режиме write_only.
+        
         Args:
             worksheet: Объект листа openpyxl
-            rows_data: Список строк данных (pandas Series)
+            rows_data (pd.DataFrame): Строки данных листа
             order_id: OrderID введенный пользователем для всех листов
+            sheet_rows: Заранее подготовленные строки из _rows_for_sheet()
+            today_date (str): Дата для столбца DueDate (по умолчанию - сегодня)
         """
         try:
-            # Получаем сегодняшнюю дату в формате 7/24/2025 (месяц/день/год)
-            from datetime import datetime
-            today = datetime.now()
-            today_date = f"{today.month}/{today.day}/{today.year}"
-            
-            # Определяем заголовки столбцов
-            headers = [
-                'OrderID',           # A
-                'PartName',          # B
-                'QuantityOrdered',   # C
-                'QuantityNested',    # D
-                'QuantityCompleted', # E
-                'ExtraAllowed',      # F
-                'Machine',           # G
-                'AssemblyID',        # H
-                'DueDate',           # I
-                'DateWindow',        # J
-                'Priority',          # K
-                'ForcedPriority',    # L
-                'NextPhase',         # M
-                'Status',            # N
-                'Material',          # O
-                'Thickness',         # P
-                'AutoTooling',       # Q
-                'ScriptTooling',     # R
-                'ScriptName',        # S
-                'ManualNesting',     # T
-                'Drawing',           # U
-                'Turret',            # V
-                'ProductionLabel',   # W
-                'Revision',          # X
-                'BendingMode',       # Y
-                'BendingParameters', # Z
-                'Parameters'         # AA
-            ]
+            if sheet_rows is None:
+                sheet_rows = self._rows_for_sheet(rows_data, worksheet.title, order_id, today_date)
+            
+            # Устанавливаем ширину столбцов (в режиме write_only - до первой записи строк)
+            for col_letter, width in self.COLUMN_WIDTHS.items():
+                worksheet.column_dimensions[col_letter] = ColumnDimension(worksheet, index=col_letter, width=width)
             
             # Записываем заголовки в первой строке
-            for col_idx, header in enumerate(headers, start=1):
-                cell = worksheet.cell(row=1, column=col_idx)
-                cell.value = header
-                cell.font = Font(name='Calibri', size=11, bold=True)
-                cell.border = Border(
-                    left=Side(style='thin'),
-                    right=Side(style='thin'),
-                    top=Side(style='thin'),
-                    bottom=Side(style='thin')
-                )
-            
-            # Получаем название листа для столбца Thickness
-            sheet_name = worksheet.title
-            
-            # Определяем машину в зависимости от толщины листа
-            machine_name = ""
-            if sheet_name in ["1mm", "2mm", "3mm"]:
-                machine_name = "A5-25"
-            elif sheet_name == "1.5mm":
-                machine_name = "E5_TOPAZ"
+            header_cells = []
+            for header in self.HEADERS:
+                cell = WriteOnlyCell(worksheet, value=header)
+                cell.font = self._HEADER_FONT
+                cell.border = self._THIN_BORDER
+                header_cells.append(cell)
+            worksheet.append(header_cells)
             
             # Записываем данные построчно начиная со второй строки
-            for row_idx, row_series in enumerate(rows_data, start=2):
-                # Проверяем, что это не заголовок (первая строка данных может содержать заголовки)
-                # Если первый элемент строки похож на заголовок, пропускаем
-                first_value = row_series.iloc[0] if len(row_series) > 0 else ""
-                if (isinstance(first_value, str) and 
-                    first_value in ['nan', 'Порядковый номер', 'OrderID', 'PartName', 'Приоритет']):
-                    logger.debug(f"Пропускаем заголовочную строку: {first_value}")
-                    continue
-                
-                # Извлекаем данные из исходных столбцов
-                # row_series содержит: A, B, C, D, E, F, G (после обработки automation_tool)
-                # Где: A=исх.A, B=исх.D, C=исх.E, D=исх.G, E=исх.H, F=исх.I, G=исх.J
-                
-                original_a = row_series.iloc[0] if len(row_series) > 0 else ""  # Исх. столбец A
-                original_d = row_series.iloc[1] if len(row_series) > 1 else ""  # Исх. столбец D
-                original_e = row_series.iloc[2] if len(row_series) > 2 else ""  # Исх. столбец E
-                original_g = row_series.iloc[3] if len(row_series) > 3 else ""  # Исх. столбец G
-                original_h = row_series.iloc[4] if len(row_series) > 4 else ""  # Исх. столбец H
-                original_i = row_series.iloc[5] if len(row_series) > 5 else ""  # Исх. столбец I (обозначение)
-                original_j = row_series.iloc[6] if len(row_series) > 6 else 0   # Исх. столбец J (количество)
-                
-                # Преобразуем обозначение ДСМК в DSMK (БЕЗ удаления суффиксов)
-                transformed_designation = ""
-                if pd.notna(original_i) and original_i:
-                    # Заменяем только ДСМК на DSMK, оставляя все суффиксы
-                    transformed_designation = str(original_i).replace('ДСМК.', 'DSMK.')
-                    # Убираем только " DXF" в конце, если есть
-                    if transformed_designation.endswith(' DXF'):
-                        transformed_designation = transformed_designation[:-4]
-                
-                # Получаем количество как int
-                quantity_int = 0
-                if pd.notna(original_j):
-                    try:
-                        if isinstance(original_j, str):
-                            clean_qty = str(original_j).strip().replace(',', '.').replace(' ', '')
-                            quantity_int = int(round(float(clean_qty))) if clean_qty else 0
-                        else:
-                            quantity_int = int(round(float(original_j)))
-                    except (ValueError, TypeError):
-                        quantity_int = 0
-                
-                # Создаем путь к файлу для столбца U (Drawing)
-                drawing_path = ""
-                if pd.notna(original_i) and original_i:
-                    # Базовый путь
-                    base_path = r"\\srvdata\FMS\ncexpress\E5_TOPAZ\PARTDIR"
-                    
-                    # Берем обозначение из столбца F (transformed_designation)
-                    part_name = transformed_designation.strip()
-                    
-                    # Извлекаем версию DXF из исходного столбца H (в обработанном файле это original_h)
-                    version = ""
-                    if pd.notna(original_h) and original_h:
-                        import re
-                        # Ищем цифру в строке типа "3" или "3.0" -> берем первую цифру
-                        version_match = re.search(r'(\d+)', str(original_h).strip())
-                        if version_match:
-                            version_digit = version_match.group(1)
-                            version = f"_V{version_digit}"
-                        else:
-                            version = "_V0"  # По умолчанию, если цифра не найдена
-                    else:
-                        version = "_V0"  # По умолчанию для пустых значений
+            number_formats = self._NUMBER_FORMATS
+            cell_value = self._cell_value
+            for new_row_data in sheet_rows:
+                # Записываем строку целиком (совместимо с режимом write_only)
+                row_cells = []
+                for value, number_format in zip(new_row_data, number_formats):
+                    value, number_format = cell_value(value, number_format)
+                    cell = WriteOnlyCell(worksheet, value=value)
                     
-                    # Добавляем толщину в зависимости от листа
-                    thickness_suffix = ""
-                    if sheet_name == "1mm":
-                        thickness_suffix = "_1mmZn"
-                    elif sheet_name == "1.5mm":
-                        thickness_suffix = "_1.5mmZn"
-                    elif sheet_name == "2mm":
-                        thickness_suffix = "_2mmZn"
-                    elif sheet_name == "3mm":
-                        thickness_suffix = "_3mmZn"
+                    # Применяем форматирование
+                    cell.border = self._THIN_BORDER
+                    cell.font = self._BODY_FONT
                     
-                    # Собираем полный путь
-                    drawing_path = f"{base_path}\\{part_name}{version}{thickness_suffix}"
+                    # Формат числовых столбцов и дат
+                    if number_format:
+                        cell.number_format = number_format
                     
-                    # Создаем полное имя детали для столбца B
-                    full_part_name = f"{part_name}{version}{thickness_suffix}"
-                
-                # Заполняем столбцы согласно новой структуре (используем общий OrderID для всего листа)
-                new_row_data = [
-                    order_id,                  # A - OrderID (введенный пользователем для всего листа)
-                    full_part_name,            # B - PartName (полное имя с версией и толщиной)
-                    quantity_int,              # C - QuantityOrdered (количество)
-                    0,                         # D - QuantityNested
-                    0,                         # E - QuantityCompleted
-                    0,                         # F - ExtraAllowed
-                    machine_name,              # G - Machine (A5-25 или E5_TOPAZ)
-                    "",                        # H - AssemblyID (пустой)
-                    today_date,                # I - DueDate (сегодняшняя дата)
-                    0,                         # J - DateWindow (в пределах данных заполнен 0)
-                    original_g if pd.notna(original_g) else "",  # K - Priority (исх. столбец G)
-                    0,                         # L - ForcedPriority
-                    0,                         # M - NextPhase
-                    0,                         # N - Status
-                    "DC01",                    # O - Material
-                    f"{float(sheet_name.replace('mm', '')) if sheet_name.replace('mm', '').replace('.', '').isdigit() else 0:.6f}",  # P - Thickness (толщина с 6 знаками после запятой)
-                    0,                         # Q - AutoTooling
-                    0,                         # R - ScriptTooling
-                    "",                        # S - ScriptName (пустой)
-                    0,                         # T - ManualNesting (в пределах данных заполнен 0)
-                    drawing_path,              # U - Drawing (путь к файлу)
-                    "",                        # V - Turret (пустой)
-                    "",                        # W - ProductionLabel (пустой)
-                    "",                        # X - Revision (пустой)
-                    -1,                        # Y - BendingMode
-                    "",                        # Z - BendingParameters (пустой)
-                    ""                         # AA - Parameters (пустой)
-                ]
+                    row_cells.append(cell)
                 
-                # Записываем данные в ячейки
-                for col_idx, value in enumerate(new_row_data, start=1):
-                    cell = worksheet.cell(row=row_idx, column=col_idx)
-                    cell.value = value
-                    
-                    # Применяем форматирование
-                    cell.border = Border(
-                        left=Side(style='thin'),
-                        right=Side(style='thin'),
-                        top=Side(style='thin'),
-                        bottom=Side(style='thin')
-                    )
-                    cell.font = Font(name='Calibri', size=11)
-                    
-                    # Для числовых столбцов устанавливаем правильный формат
-                    if col_idx in [3, 4, 5, 6, 12, 13, 14, 17, 18, 25]:  # C, D, E, F, L, M, N, Q, R, Y
-                        if isinstance(value, (int, float)):
-                            cell.number_format = '0'
-            
-            # Устанавливаем ширину столбцов
-            column_widths = {
-                'A': 25, 'B': 25, 'C': 12, 'D': 12, 'E': 12, 'F': 10, 'G': 15,
-                'H': 12, 'I': 12, 'J': 12, 'K': 10, 'L': 10, 'M': 10, 'N': 8,
-                'O': 10, 'P': 10, 'Q': 10, 'R': 10, 'S': 15, 'T': 20, 'U': 15,
-                'V': 10, 'W': 15, 'X': 10, 'Y': 10, 'Z': 15, 'AA': 15
-            }
-            
-            for col_letter, width in column_widths.items():
-                worksheet.column_dimensions[col_letter].width = width
+                worksheet.append(row_cells)
             
             logger.info(f"Лист заполнен: {len(rows_data)} строк данных + заголовки")
             
@@ -593,35 +808,11 @@ class MaterialSorter:
         
         # Подсчитываем количество для каждой группы
         for thickness, rows in self.thickness_groups.items():
-            thickness_quantity = 0
-            for row in rows:
-                qty_value = row.iloc[6]  # Столбец G (индекс 6)
-                if pd.notna(qty_value):
-                    try:
-                        if isinstance(qty_value, str):
-                            clean_qty = str(qty_value).strip().replace(',', '.').replace(' ', '')
-                            qty_num = int(round(float(clean_qty))) if clean_qty else 0
-                        else:
-                            qty_num = int(round(float(qty_value)))
-                        thickness_quantity += qty_num
-                    except (ValueError, TypeError):
-                        pass
+            thickness_quantity = self._sum_quantity(rows.iloc[:, 6])  # Столбец G (индекс 6)
             info += f"  {thickness}: {len(rows)} строк, количество: {thickness_quantity}\n"
         
-        if hasattr(self, 'unmatched_rows') and self.unmatched_rows:
-            unmatched_quantity = 0
-            for row in self.unmatched_rows:
-                qty_value = row.iloc[6]  # Столбец G
-                if pd.notna(qty_value):
-                    try:
-                        if isinstance(qty_value, str):
-                            clean_qty = str(qty_value).strip().replace(',', '.').replace(' ', '')
-                            qty_num = int(round(float(clean_qty))) if clean_qty else 0
-                        else:
-                            qty_num = int(round(float(qty_value)))
-                        unmatched_quantity += qty_num
-                    except (ValueError, TypeError):
-                        pass
+        if hasattr(self, 'unmatched_rows') and len(self.unmatched_rows):
+            unmatched_quantity = self._sum_quantity(self.unmatched_rows.iloc[:, 6])  # Столбец G
             info += f"  Неопределенные: {len(self.unmatched_rows)} строк, количество: {unmatched_quantity}\n"
         
         # Добавляем общую информацию
@@ -697,7 +888,7 @@ def main():
             if hasattr(sorter, 'thickness_groups'):
                 for thickness in sorter.thickness_groups.keys():
                     print(f"  • {thickness}")
-            if hasattr(sorter, 'unmatched_rows') and sorter.unmatched_rows:
+            if hasattr(sorter, 'unmatched_rows') and len(sorter.unmatched_rows):
                 print(f"  • Неопределенные")
         else:
             print("✗ Ошибка при создании файла")
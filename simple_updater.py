@@ -6,9 +6,15 @@
 Избегает проблем с emoji в semantic-release
 """
 
+import asyncio
+import hashlib
 import subprocess
 import sys
 import logging
+import mmap
+import re
+import tempfile
+import time
 from pathlib import Path
 from packaging import version
 import json
@@ -16,6 +22,23 @@ from typing import Optional, Tuple
 import os
 
 
+# Шаблоны строк с версией (компилируются один раз при импорте).
+# В pyproject.toml ищем только строку, начинающуюся с version, чтобы не задеть
+# похожие фрагменты в зависимостях и других секциях
+_PYPROJECT_VERSION_RE = re.compile(r'^version\s*=\s*"[^"]*"', re.MULTILINE)
+_PY_VERSION_RE = re.compile(r'__version__\s*=\s*["\'][^"\']*["\']')
+
+# Те же шаблоны для поиска значения версии в байтах файла (группа 1 - значение в кавычках)
+_PYPROJECT_VERSION_VALUE_RE = re.compile(rb'^version\s*=\s*"([^"]*)"', re.MULTILINE)
+_PY_VERSION_VALUE_RE = re.compile(rb'__version__\s*=\s*["\']([^"\']*)["\']')
+
+# Список тегов версий удаленного репозитория без скачивания объектов
+_LS_REMOTE_TAGS_COMMAND = ["git", "ls-remote", "--tags", "--refs", "origin", "v*.*.*"]
+
+# Сколько секунд последняя удаленная версия берется из кэша без запроса к git
+_REMOTE_VERSION_CACHE_TTL = 300
+
+
 class SimpleUpdater:
     """Простая система обновлений без Unicode проблем"""
     
@@ -28,34 +51,153 @@ class SimpleUpdater:
             repo_path: Путь к Git репозиторию (по умолчанию - текущая директория)
         """
         self.current_version = current_version
+        self._parsed_current_ver = None  # Разобранная текущая версия (см. _current_ver)
         self.repo_path = repo_path or Path.cwd()
         self.logger = logging.getLogger(__name__)
+        self._git_env = self._build_git_env()  # Окружение для git не меняется - строим один раз
+        
+        # Файл кэша последней удаленной версии (свой для каждого репозитория)
+        repo_hash = hashlib.sha1(str(self.repo_path).encode('utf-8')).hexdigest()[:8]
+        self._cache_path = Path(tempfile.gettempdir()) / f"topaz_update_{repo_hash}.json"
     
-    def check_for_updates(self) -> Tuple[bool, Optional[str]]:
+    @property
+    def _current_ver(self):
+        """
+        Текущая версия, разобранная один раз при первом обращении
+        
+        Разбор отложен до проверки обновлений: некорректная строка версии не мешает
+        создать обновлятор, а ошибка обрабатывается там же, где и раньше.
+        
+        Raises:
+            InvalidVersion: Строка текущей версии некорректна
+        """
+        if self._parsed_current_ver is None:
+            self._parsed_current_ver = version.parse(self.current_version)
+        return self._parsed_current_ver
+    
+    def check_for_updates(self, force: bool = False) -> Tuple[bool, Optional[str]]:
         """
         Проверяет наличие обновлений
         
+        Args:
+            force: Запросить удаленный репозиторий, даже если есть свежий результат в кэше
+        
         Returns:
             Tuple[bool, Optional[str]]: (есть_обновления, новая_версия)
         """
         try:
-            # Получаем список удаленных тегов
-            latest_version = self._get_latest_remote_version()
-            if not latest_version:
-                self.logger.warning("Не удалось получить удаленные версии")
+            if not self._can_check_remote():
                 return False, None
             
-            # Сравниваем версии
-            current_ver = version.parse(self.current_version)
-            latest_ver = version.parse(latest_version)
+            latest_version = None if force else self._load_cached_remote_version()
+            if latest_version is None:
+                # Получаем список удаленных тегов
+                latest_version = self._get_latest_remote_version()
+                self._save_cached_remote_version(latest_version)
+            return self._compare_with_current(latest_version)
+            
+        except Exception as e:
+            self.logger.error(f"Ошибка при проверке обновлений: {e}")
+            return False, None
+    
+    async def check_for_updates_async(self, force: bool = False) -> Tuple[bool, Optional[str]]:
+        """
+        Проверяет наличие обновлений, не блокируя цикл событий
+        
+        git запускается через asyncio.create_subprocess_exec, поэтому ожидание
+        ответа удаленного репозитория не занимает поток вызывающего кода.
+        
+        Args:
+            force: Запросить удаленный репозиторий, даже если есть свежий результат в кэше
+        
+        Returns:
+            Tuple[bool, Optional[str]]: (есть_обновления, новая_версия)
+        """
+        try:
+            if not self._can_check_remote():
+                return False, None
             
-            has_update = latest_ver > current_ver
-            return has_update, latest_version if has_update else None
+            latest_version = None if force else self._load_cached_remote_version()
+            if latest_version is None:
+                latest_version = await self._get_latest_remote_version_async()
+                self._save_cached_remote_version(latest_version)
+            return self._compare_with_current(latest_version)
             
         except Exception as e:
             self.logger.error(f"Ошибка при проверке обновлений: {e}")
             return False, None
     
+    def _can_check_remote(self) -> bool:
+        """
+        Быстрые проверки перед запуском git
+        
+        Обновления не ищутся для dev-сборок и вне Git репозитория
+        (например, при запуске собранного exe из папки установки).
+        
+        Returns:
+            bool: True, если имеет смысл запрашивать удаленный репозиторий
+        """
+        if self._current_ver.is_devrelease:
+            self.logger.info(f"Версия {self.current_version} - dev-сборка, проверка обновлений пропущена")
+            return False
+        
+        # git ищет репозиторий вверх по дереву папок - проверяем так же
+        repo_path = Path(self.repo_path).resolve()
+        if not any((path / ".git").exists() for path in (repo_path, *repo_path.parents)):
+            self.logger.info(f"{self.repo_path} не является Git репозиторием, проверка обновлений пропущена")
+            return False
+        
+        return True
+    
+    def _load_cached_remote_version(self) -> Optional[str]:
+        """
+        Возвращает последнюю удаленную версию из кэша, если он моложе _REMOTE_VERSION_CACHE_TTL
+        
+        Returns:
+            str: Версия из кэша или None (кэша нет, он устарел или поврежден)
+        """
+        try:
+            if time.time() - self._cache_path.stat().st_mtime >= _REMOTE_VERSION_CACHE_TTL:
+                return None
+            return json.loads(self._cache_path.read_text(encoding='utf-8')).get('latest_version')
+        except (OSError, ValueError, AttributeError):
+            return None
+    
+    def _save_cached_remote_version(self, latest_version: Optional[str]):
+        """
+        Сохраняет последнюю удаленную версию в кэш (неудачные проверки не кэшируются)
+        
+        Args:
+            latest_version: Последняя удаленная версия или None
+        """
+        if not latest_version:
+            return
+        
+        try:
+            self._cache_path.write_text(json.dumps({'latest_version': latest_version}), encoding='utf-8')
+        except OSError as e:
+            self.logger.warning(f"Не удалось сохранить кэш проверки обновлений: {e}")
+    
+    def _compare_with_current(self, latest_version: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        Сравнивает найденную удаленную версию с текущей
+        
+        Args:
+            latest_version: Последняя удаленная версия или None
+            
+        Returns:
+            Tuple[bool, Optional[str]]: (есть_обновления, новая_версия)
+        """
+        if not latest_version:
+            self.logger.warning("Не удалось получить удаленные версии")
+            return False, None
+        
+        # Сравниваем версии
+        latest_ver = version.parse(latest_version)
+        
+        has_update = latest_ver > self._current_ver
+        return has_update, latest_version if has_update else None
+    
     def _get_latest_remote_version(self) -> Optional[str]:
         """
         Получает последнюю версию из удаленного репозитория
@@ -64,60 +206,89 @@ class SimpleUpdater:
             str: Последняя версия или None
         """
         try:
-            # Обновляем информацию о удаленном репозитории
-            fetch_result = subprocess.run([
-                "git", "fetch", "--tags"
-            ], 
-            cwd=self.repo_path, 
-            capture_output=True, 
-            text=True,
-            env=self._get_clean_env()
+            # Запрашиваем список тегов версий прямо с удаленного репозитория:
+            # теги не скачиваются в .git, нужен один процесс и один запрос по сети
+            tags_result = subprocess.run(
+                _LS_REMOTE_TAGS_COMMAND,
+                cwd=self.repo_path, 
+                capture_output=True, 
+                text=True,
+                env=self._git_env
             )
             
-            if fetch_result.returncode != 0:
-                self.logger.error(f"Ошибка git fetch: {fetch_result.stderr}")
+            if tags_result.returncode != 0:
+                self.logger.error(f"Ошибка git ls-remote: {tags_result.stderr}")
                 return None
             
-            # Получаем список всех тегов
-            tags_result = subprocess.run([
-                "git", "tag", "-l", "--sort=-version:refname"
-            ], 
-            cwd=self.repo_path, 
-            capture_output=True, 
-            text=True,
-            env=self._get_clean_env()
+            return self._parse_latest_version(tags_result.stdout)
+            
+        except Exception as e:
+            self.logger.error(f"Ошибка при получении удаленных версий: {e}")
+            return None
+    
+    async def _get_latest_remote_version_async(self) -> Optional[str]:
+        """
+        Асинхронно получает последнюю версию из удаленного репозитория
+        
+        Returns:
+            str: Последняя версия или None
+        """
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *_LS_REMOTE_TAGS_COMMAND,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=str(self.repo_path),
+                env=self._git_env
             )
+            stdout, stderr = await process.communicate()
             
-            if tags_result.returncode != 0:
-                self.logger.error(f"Ошибка git tag: {tags_result.stderr}")
+            if process.returncode != 0:
+                self.logger.error(f"Ошибка git ls-remote: {stderr.decode('utf-8', errors='replace')}")
                 return None
             
-            # Парсим теги и находим последнюю семантическую версию
-            tags = tags_result.stdout.strip().split('\n')
-            valid_versions = []
-            
-            for tag in tags:
-                tag = tag.strip()
-                if not tag:
-                    continue
-                    
-                # Убираем префикс 'v' если есть
-                version_str = tag.lstrip('v')
-                
-                try:
-                    # Проверяем, что это валидная семантическая версия
-                    parsed_version = version.parse(version_str)
-                    if not parsed_version.is_prerelease:  # Игнорируем pre-release
-                        valid_versions.append(version_str)
-                except Exception:
-                    continue
-            
-            return valid_versions[0] if valid_versions else None
+            return self._parse_latest_version(stdout.decode('utf-8', errors='replace'))
             
         except Exception as e:
             self.logger.error(f"Ошибка при получении удаленных версий: {e}")
             return None
     
+    @staticmethod
+    def _parse_latest_version(ls_remote_output: str) -> Optional[str]:
+        """
+        Находит последнюю семантическую версию в выводе git ls-remote
+        
+        Args:
+            ls_remote_output: Строки вида "<sha>\trefs/tags/v1.2.3"
+            
+        Returns:
+            str: Последняя версия (без pre-release) или None
+        """
+        # Самую новую версию находим за один проход
+        best_version = None
+        best_version_str = None
+        
+        for line in ls_remote_output.splitlines():
+            if not line.strip():
+                continue
+            
+            # Убираем префикс 'refs/tags/v'
+            version_str = line.rsplit('refs/tags/v', 1)[-1].strip()
+            
+            try:
+                # Проверяем, что это валидная семантическая версия
+                parsed_version = version.parse(version_str)
+            except Exception:
+                continue
+            
+            if parsed_version.is_prerelease:  # Игнорируем pre-release
+                continue
+            
+            if best_version is None or parsed_version > best_version:
+                best_version, best_version_str = parsed_version, version_str
+        
+        return best_version_str
+    
     def create_new_version(self, bump_type: str = "patch") -> Optional[str]:
         """
         Создает новую версию и тег
@@ -129,7 +300,7 @@ class SimpleUpdater:
             str: Новая версия или None при ошибке
         """
         try:
-            current_ver = version.parse(self.current_version)
+            current_ver = self._current_ver
             
             # Увеличиваем версию
             if bump_type == "major":
@@ -146,7 +317,7 @@ class SimpleUpdater:
             cwd=self.repo_path,
             capture_output=True,
             text=True,
-            env=self._get_clean_env()
+            env=self._git_env
             )
             
             if tag_result.returncode != 0:
@@ -160,7 +331,7 @@ class SimpleUpdater:
             cwd=self.repo_path,
             capture_output=True,
             text=True,
-            env=self._get_clean_env()
+            env=self._git_env
             )
             
             if push_result.returncode != 0:
@@ -201,13 +372,15 @@ class SimpleUpdater:
     def _update_pyproject_version(self, new_version: str, pyproject_file: Path) -> bool:
         """Обновляет версию в pyproject.toml"""
         try:
+            # Версия той же длины (1.2.3 -> 1.2.4) заменяется прямо в файле
+            if self._patch_version_in_place(pyproject_file, _PYPROJECT_VERSION_VALUE_RE, new_version):
+                return True
+            
             content = pyproject_file.read_text(encoding='utf-8')
             
             # Простая замена версии в pyproject.toml
-            import re
-            pattern = r'version\s*=\s*"[^"]*"'
             replacement = f'version = "{new_version}"'
-            new_content = re.sub(pattern, replacement, content)
+            new_content = _PYPROJECT_VERSION_RE.sub(replacement, content)
             
             pyproject_file.write_text(new_content, encoding='utf-8')
             return True
@@ -219,13 +392,15 @@ class SimpleUpdater:
     def _update_python_version(self, new_version: str, py_file: Path) -> bool:
         """Обновляет версию в Python файле"""
         try:
+            # Версия той же длины заменяется прямо в файле
+            if self._patch_version_in_place(py_file, _PY_VERSION_VALUE_RE, new_version):
+                return True
+            
             content = py_file.read_text(encoding='utf-8')
             
             # Простая замена __version__
-            import re
-            pattern = r'__version__\s*=\s*["\'][^"\']*["\']'
             replacement = f'__version__ = "{new_version}"'
-            new_content = re.sub(pattern, replacement, content)
+            new_content = _PY_VERSION_RE.sub(replacement, content)
             
             py_file.write_text(new_content, encoding='utf-8')
             return True
@@ -234,9 +409,45 @@ class SimpleUpdater:
             self.logger.error(f"Ошибка обновления Python файла: {e}")
             return False
     
-    def _get_clean_env(self) -> dict:
+    @staticmethod
+    def _patch_version_in_place(version_file: Path, value_pattern: re.Pattern, new_version: str) -> bool:
         """
-        Получает окружение без проблемных переменных для Git
+        Заменяет значение версии в файле на месте через mmap
+        
+        Перезаписываются только байты значения, без чтения и записи всего файла.
+        Работает, только если длина новой версии совпадает с длиной старой.
+        
+        Args:
+            version_file: Путь к файлу версии
+            value_pattern: Шаблон (bytes), группа 1 которого - значение версии
+            new_version: Новая версия
+            
+        Returns:
+            bool: True, если версия заменена; False - нужна полная перезапись файла
+        """
+        new_value = new_version.encode('utf-8')
+        
+        with open(version_file, 'r+b') as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0)
+            except ValueError:
+                return False  # Пустой файл нельзя отобразить в память
+            
+            with mm:
+                spans = [match.span(1) for match in value_pattern.finditer(mm)]
+                if not spans or any(end - start != len(new_value) for start, end in spans):
+                    return False
+                
+                for start, end in spans:
+                    mm[start:end] = new_value
+                mm.flush()
+        
+        return True
+    
+    @staticmethod
+    def _build_git_env() -> dict:
+        """
+        Строит окружение без проблемных переменных для Git
         
         Returns:
             dict: Очищенное окружение
@@ -253,6 +464,15 @@ class SimpleUpdater:
         
         return env
     
+    def _get_clean_env(self) -> dict:
+        """
+        Получает окружение без проблемных переменных для Git
+        
+        Returns:
+            dict: Очищенное окружение (общее для всех вызовов git этого обновлятора)
+        """
+        return self._git_env
+    
     def get_commit_info(self) -> dict:
         """
         Получает информацию о текущем коммите
@@ -261,40 +481,25 @@ class SimpleUpdater:
             dict: Информация о коммите
         """
         try:
-            # Получаем хеш коммита
-            hash_result = subprocess.run([
-                "git", "rev-parse", "--short", "HEAD"
+            # Хеш, сообщение (только первая строка) и дата коммита одним вызовом git,
+            # поля разделены символом \x1f
+            log_result = subprocess.run([
+                "git", "log", "-1", "--pretty=format:%h%x1f%s%x1f%ci"
             ],
             cwd=self.repo_path,
             capture_output=True,
             text=True,
-            env=self._get_clean_env()
+            env=self._git_env
             )
             
-            # Получаем сообщение коммита (только первую строку)
-            msg_result = subprocess.run([
-                "git", "log", "-1", "--pretty=format:%s"
-            ],
-            cwd=self.repo_path,
-            capture_output=True,
-            text=True,
-            env=self._get_clean_env()
-            )
-            
-            # Получаем дату коммита
-            date_result = subprocess.run([
-                "git", "log", "-1", "--pretty=format:%ci"
-            ],
-            cwd=self.repo_path,
-            capture_output=True,
-            text=True,
-            env=self._get_clean_env()
-            )
+            if log_result.returncode != 0:
+                return {'hash': 'unknown', 'message': 'No message', 'date': 'unknown'}
             
+            commit_hash, message, date = log_result.stdout.split('\x1f', 2)
             return {
-                'hash': hash_result.stdout.strip() if hash_result.returncode == 0 else 'unknown',
-                'message': msg_result.stdout.strip() if msg_result.returncode == 0 else 'No message',
-                'date': date_result.stdout.strip() if date_result.returncode == 0 else 'unknown'
+                'hash': commit_hash.strip(),
+                'message': message.strip(),
+                'date': date.strip()
             }
             
         except Exception as e:
@@ -321,7 +526,7 @@ class SimpleUpdater:
             cwd=self.repo_path,
             capture_output=True,
             text=True,
-            env=self._get_clean_env()
+            env=self._git_env
             )
             
             if status_result.returncode != 0:
@@ -337,7 +542,7 @@ class SimpleUpdater:
                 cwd=self.repo_path,
                 capture_output=True,
                 text=True,
-                env=self._get_clean_env()
+                env=self._git_env
                 )
                 
                 if stash_result.returncode != 0:
@@ -351,7 +556,7 @@ class SimpleUpdater:
             cwd=self.repo_path,
             capture_output=True,
             text=True,
-            env=self._get_clean_env()
+            env=self._git_env
             )
             
             if fetch_result.returncode != 0:
@@ -365,7 +570,7 @@ class SimpleUpdater:
             cwd=self.repo_path,
             capture_output=True,
             text=True,
-            env=self._get_clean_env()
+            env=self._git_env
             )
             
             if checkout_result.returncode != 0:
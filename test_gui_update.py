@@ -4,6 +4,7 @@
 """
 
 import tkinter as tk
+import asyncio
 import threading
 import time
 import sys
@@ -11,7 +12,8 @@ from pathlib import Path
 
 # Импортируем наш GUI модуль
 sys.path.append(str(Path(__file__).parent))
-from excel_automation_gui import ExcelAutomationGUI
+from excel_automation_gui import ExcelAutomationGUI, __version__
+from simple_updater import SimpleUpdater
 
 def test_update_button():
     """Тестирует кнопку обновления автоматически"""
@@ -50,5 +52,44 @@ def test_update_button():
     root.after(8000, root.quit)  # Автоматически закрываем через 8 секунд
     root.mainloop()
 
+def test_async_update_check():
+    """Тестирует асинхронную проверку обновлений без блокировки mainloop"""
+    print("🧪 Запуск теста асинхронной проверки обновлений...")
+    
+    root = tk.Tk()
+    root.withdraw()
+    
+    # Цикл событий asyncio работает в отдельном потоке, Tk опрашивает результат через after()
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    loop_thread.start()
+    
+    updater = SimpleUpdater(__version__, Path(__file__).parent)
+    future = asyncio.run_coroutine_threadsafe(updater.check_for_updates_async(), loop)
+    ticks = 0
+    
+    def poll():
+        nonlocal ticks
+        if future.done():
+            try:
+                has_update, new_version = future.result()
+                print(f"✅ Проверка завершена: есть обновление={has_update}, версия={new_version}")
+                print(f"⏱️  Mainloop обработал {ticks} тиков во время проверки")
+            except Exception as e:
+                print(f"❌ Ошибка в тесте: {e}")
+            root.quit()
+        else:
+            ticks += 1
+            root.after(100, poll)
+    
+    root.after(100, poll)
+    root.after(15000, root.quit)  # Автоматически закрываем через 15 секунд
+    root.mainloop()
+    
+    loop.call_soon_threadsafe(loop.stop)
+    loop_thread.join(timeout=1)
+    root.destroy()
+
 if __name__ == "__main__":
     test_update_button()
+    test_async_update_check()
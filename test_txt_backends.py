@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Проверка конвертера Excel -> TXT на двух движках чтения
+
+Одна и та же книга конвертируется через openpyxl и через python-calamine,
+TXT файлы должны совпасть байт в байт.
+"""
+
+import sys
+import tempfile
+from datetime import date, datetime, time
+from pathlib import Path
+
+from openpyxl import Workbook
+
+sys.path.append(str(Path(__file__).parent))
+import excel_to_txt_converter
+from excel_to_txt_converter import ExcelToTxtConverter
+
+
+def create_fixture_workbook(path: Path):
+    """Создает книгу с листами разной формы и значениями разных типов"""
+    wb = Workbook()
+
+    # Лист с данными от A1: числа, текст, даты, пустые ячейки в середине и в конце строки
+    ws = wb.active
+    ws.title = "1.5mm"
+    ws.append(["OrderID", "PartName", "Quantity", "DueDate", "Thickness", "Flag", "Time"])
+    ws.append(["25-072", "DSMK.123.001_V3_1.5", 4, "7/24/2025", "1.500000", True, None])
+    ws.append(["25-072", "Деталь с кириллицей", 3.0, datetime(2025, 7, 24, 10, 30), 2.5, False, time(10, 30)])
+    ws.append(["25-072", None, 1e20, date(2025, 7, 24), -7, None, None])
+    ws.append([None, "", 123456789012345, 0.1, None, None, None])
+
+    # Лист, данные которого начинаются не с A1 (пустые строки и столбцы слева и сверху)
+    ws = wb.create_sheet("2mm")
+    ws["C3"] = "C3"
+    ws["E3"] = 5
+    ws["D5"] = "D5"
+    ws["F6"] = 1.25
+
+    # Пустой лист
+    wb.create_sheet("3mm")
+
+    wb.save(path)
+
+
+def convert_with_backend(input_file: Path, output_dir: Path, use_calamine: bool):
+    """Конвертирует все листы книги, читая ее через выбранный движок"""
+    saved_flag = excel_to_txt_converter._HAS_CALAMINE
+    excel_to_txt_converter._HAS_CALAMINE = use_calamine
+    try:
+        converter = ExcelToTxtConverter(str(input_file))
+        assert converter.load_workbook()
+        return converter.convert_all_sheets(output_dir)
+    finally:
+        excel_to_txt_converter._HAS_CALAMINE = saved_flag
+
+
+def test_calamine_matches_openpyxl():
+    """TXT файлы, полученные через calamine и через openpyxl, совпадают"""
+    if not excel_to_txt_converter._HAS_CALAMINE:
+        print("⚠️  python-calamine не установлен, тест пропущен")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_file = tmp / "25-072_by_thickness.xlsx"
+        create_fixture_workbook(input_file)
+
+        openpyxl_files = convert_with_backend(input_file, tmp / "openpyxl", use_calamine=False)
+        calamine_files = convert_with_backend(input_file, tmp / "calamine", use_calamine=True)
+
+        assert [f.name for f in openpyxl_files] == [f.name for f in calamine_files]
+        assert openpyxl_files, "Не создано ни одного TXT файла"
+
+        for openpyxl_file, calamine_file in zip(openpyxl_files, calamine_files):
+            assert openpyxl_file.read_bytes() == calamine_file.read_bytes(), \
+                f"Файл {openpyxl_file.name} отличается на движке calamine"
+
+        print(f"✅ Движки дали одинаковые файлы: {[f.name for f in openpyxl_files]}")
+
+
+if __name__ == "__main__":
+    test_calamine_matches_openpyxl()